@@ -1,11 +1,20 @@
+import time
+_IMPORT_START = time.perf_counter()  # Taken before the heavy imports so the startup report can include them
+
 import pygame
 import random
 import math
-from enum import Enum, auto
-from cryptography.fernet import Fernet
-from sklearn.linear_model import LinearRegression
+import io
+import itertools
+import json
+import mmap
+import threading
+from collections import OrderedDict, namedtuple
+from enum import Enum
 import numpy as np
 import os
+import struct
+import zipfile
 
 # Player movement and shooting mechanics
 
@@ -19,12 +28,25 @@ import os
 
 # Collision detection and game-over handling
 
-pygame.init()
-
 # Constants
-screen = pygame.display.set_mode()
-SCREEN_WIDTH, SCREEN_HEIGHT = screen.get_size()
-FPS = 60
+SCREEN_WIDTH, SCREEN_HEIGHT = 0, 0  # Set by init_display() once the window exists
+FPS = 60  # Simulation steps per second
+RENDER_FPS = 120  # Cap on frames drawn per second; 0 draws as fast as possible
+MAX_CATCHUP_STEPS = 5  # Most simulation steps run for one drawn frame before the game slows down instead
+
+# Spatial hash cells are as wide as the largest possible sum of two radii (the boss's 40 is the biggest),
+# so every overlap with a point lies in the 3x3 block of cells around it.
+MAX_RADIUS = 40
+GRID_CELL_SIZE = 2 * MAX_RADIUS
+
+# Sprite rotation is quantized to this many angles (5 degree steps at 72)
+ROTATION_STEPS = 72
+TEXT_CACHE_ENTRIES = 256
+DIRTY_AREA_LIMIT = 0.4  # Fraction of the screen above which a full flip beats updating dirty rects
+ROTATION_CACHE_BYTES = 64 * 1024 * 1024
+
+# Homing bullets keep their target for this many frames before searching for the nearest enemy again
+HOMING_RETARGET_FRAMES = 10
 
 # Colors
 WHITE = (255, 255, 255)
@@ -37,18 +59,643 @@ PURPLE = (128, 0, 128)
 ORANGE = (255, 165, 0)
 CYAN = (0, 255, 255)
 PINK = (255, 125, 125)
+COLORS = {"WHITE": WHITE, "BLACK": BLACK, "RED": RED, "GREEN": GREEN, "BLUE": BLUE, "YELLOW": YELLOW,
+          "PURPLE": PURPLE, "ORANGE": ORANGE, "CYAN": CYAN, "PINK": PINK}  # Names usable in data files
 
 KEY_FILE = "key.key"
+HIGH_SCORE_FILE = "highscore.txt"  # The leaderboard, Fernet-encrypted with the key in KEY_FILE
+LEADERBOARD_SIZE = 10
+PROFILE_FILE = "frame_profile.csv"
+SNAPSHOT_FILE = "quicksave.bhs"
+BOSS_PATTERN_FILE = "Patterns/boss_patterns.json"
+SNAPSHOT_MAGIC = b"BHSS\x03"
+
+# Music state -> (track, loops). Tracks stream through pygame.mixer.music; -1 loops forever
+MUSIC_TRACKS = {
+    "gameplay": ("Music/background_music.mp3", -1),
+    "boss": ("Music/boss_music.mp3", -1),
+    "victory": ("Music/victory_music.mp3", 0),
+    "game_over": ("Music/game_over_music.mp3", -1),
+}
+MUSIC_NEXT = {  # States that can follow each one, whose files are prefetched on entering it
+    "gameplay": ("boss", "game_over"),
+    "boss": ("victory", "game_over"),
+    "victory": ("gameplay",),
+    "game_over": ("gameplay",),
+}
+MUSIC_VOLUME = 0.5
+MUSIC_FADE_MS = 800
+
+# Sprites, the scaled background and the music packed into one file, rebuilt whenever a source changes
+ASSET_BUNDLE_FILE = "assets.bundle"
+ASSET_BUNDLE_MAGIC = b"BHAB\x01"
+ASSET_BUNDLE_RESOLUTIONS = 4  # Most screen sizes a bundle keeps a pre-scaled background for
+BACKGROUND_FILE = "BackGround/Background.png"
+
+# Score predictor samples from finished runs, kept as fixed-dtype records plus their normal-equation sums
+TRAINING_STORE_FILE = "score_history.bin"
+TRAINING_MODEL_FILE = "score_model.npy"
+TRAINING_STORE_MAX_ROWS = 20000
+TRAINING_SAMPLE_STRIDE = 60  # Store one sample per second of play
+
+CIPHER = None  # Created by get_cipher() the first time the high score is read or written
+_CIPHER_LOCK = threading.Lock()
+
+
+def get_cipher():
+    """Loads (or creates) the Fernet key on first use; cryptography is only imported then."""
+    global CIPHER
+    with _CIPHER_LOCK:
+        if CIPHER is None:
+            from cryptography.fernet import Fernet
+
+            if os.path.exists(KEY_FILE):
+                with open(KEY_FILE, "rb") as keyfile:
+                    key = keyfile.read()
+            else:
+                key = Fernet.generate_key()
+                with open(KEY_FILE, "wb") as keyfile:
+                    keyfile.write(key)
+            CIPHER = Fernet(key)
+        return CIPHER
+
+
+def init_display():
+    """Initializes pygame and opens the window, once per process."""
+    global SCREEN_WIDTH, SCREEN_HEIGHT
+    screen = pygame.display.get_surface()
+    if screen is None:
+        pygame.init()
+        screen = pygame.display.set_mode()
+        SCREEN_WIDTH, SCREEN_HEIGHT = screen.get_size()
+    return screen
+
+
+class BackgroundTask:
+    """Runs a function on a daemon thread; result() waits for it and re-raises its error."""
+
+    def __init__(self, function, *args):
+        self.value = None
+        self.error = None
+        self.thread = threading.Thread(target=self.run, args=(function, args), daemon=True)
+        self.thread.start()
+
+    def run(self, function, args):
+        try:
+            self.value = function(*args)
+        except Exception as e:
+            self.error = e
+
+    def done(self):
+        return not self.thread.is_alive()
+
+    def result(self):
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+def lerp(start, end, alpha):
+    return start + (end - start) * alpha
+
+
+class StartupTimer:
+    """Wall-clock time the main thread spends in each startup phase."""
+
+    def __init__(self, start):
+        self.last = start
+        self.phases = []
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self):
+        lines = [f"  {phase:<12}{seconds * 1000:8.1f} ms" for phase, seconds in self.phases]
+        lines.append(f"  {'total':<12}{sum(seconds for _, seconds in self.phases) * 1000:8.1f} ms")
+        return "Startup timing:\n" + "\n".join(lines)
+
 
-if os.path.exists(KEY_FILE):
-    with open(KEY_FILE, "rb") as keyfile:
-        KEY = keyfile.read()
-else:
-    KEY = Fernet.generate_key()
-    with open(KEY_FILE, "wb") as keyfile:
-        keyfile.write(KEY)
+STARTUP = StartupTimer(_IMPORT_START)
 
-CIPHER = Fernet(KEY)
+
+class StageTimer:
+    """Accumulates wall-clock time per named stage of a frame."""
+
+    def __init__(self):
+        self.totals = {}
+        self.last = 0.0
+
+    def start(self):
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.totals[stage] = self.totals.get(stage, 0.0) + now - self.last
+        self.last = now
+
+
+class NullTimer:
+    """Stand-in for StageTimer when nothing is being measured."""
+
+    def start(self):
+        pass
+
+    def lap(self, stage):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class FrameProfiler:
+    """Per-stage timings of the last `capacity` frames, with an on-screen overlay and CSV export."""
+    STAGES = ("input", "player", "enemies", "collisions", "predictor", "draw", "flip")
+    COUNTS = ("enemies", "player_bullets", "hostile_bullets")
+
+    def __init__(self, capacity=600):
+        self.capacity = capacity
+        self.slots = {stage: i for i, stage in enumerate(self.STAGES)}
+        self.timings = np.zeros((capacity, len(self.STAGES)))
+        self.counts = np.zeros((capacity, len(self.COUNTS)), dtype=np.int32)
+        self.frames = 0
+        self.current = [0.0] * len(self.STAGES)
+        self.last = 0.0
+        self.overlay_lines = []
+        self.font = None
+
+    def start(self):
+        self.current = [0.0] * len(self.STAGES)
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.current[self.slots[stage]] += now - self.last
+        self.last = now
+
+    def end_frame(self, sim):
+        row = self.frames % self.capacity
+        self.timings[row] = self.current
+        self.counts[row] = (len(sim.enemies), len(sim.player.bullets),
+                            sum(len(enemy.bullets) for enemy in sim.enemies))
+        self.frames += 1
+
+    def recorded(self):
+        """Row indices of the buffered frames, oldest first."""
+        if self.frames <= self.capacity:
+            return np.arange(self.frames)
+        return (np.arange(self.capacity) + self.frames) % self.capacity
+
+    def draw(self, screen):
+        if self.font is None:
+            self.font = pygame.font.Font(None, 22)
+        if self.frames and (not self.overlay_lines or self.frames % 15 == 0):  # Refresh four times a second
+            rows = self.recorded()
+            ms = self.timings[rows] * 1000
+            p50, p99 = np.percentile(ms, [50, 99], axis=0)
+            total50, total99 = np.percentile(ms.sum(axis=1), [50, 99])
+            counts = self.counts[rows[-1]]
+            lines = [f"{'stage':<11}{'p50':>7}{'p99':>7}  ms"]
+            lines += [f"{stage:<11}{p50[i]:7.2f}{p99[i]:7.2f}" for i, stage in enumerate(self.STAGES)]
+            lines.append(f"{'frame':<11}{total50:7.2f}{total99:7.2f}  budget {1000 / FPS:.1f}")
+            lines.append(f"enemies {counts[0]}  bullets {counts[1]}  hostile {counts[2]}")
+            self.overlay_lines = [(self.font.render(line, True, RED if line.startswith("frame") and
+                                                    total99 > 1000 / FPS else WHITE)) for line in lines]
+        rects = []
+        y = 80
+        for text in self.overlay_lines:
+            rects.append(screen.fill(BLACK, text.get_rect(topleft=(10, y))))
+            screen.blit(text, (10, y))
+            y += 18
+        return rects
+
+    def dump_csv(self, path):
+        rows = self.recorded()
+        first = self.frames - len(rows)
+        with open(path, "w") as file:
+            file.write(",".join(("frame",) + tuple(f"{stage}_ms" for stage in self.STAGES) + ("total_ms",) +
+                                self.COUNTS) + "\n")
+            for k, row in enumerate(rows):
+                ms = self.timings[row] * 1000
+                fields = [str(first + k)] + [f"{value:.4f}" for value in ms] + [f"{ms.sum():.4f}"]
+                fields += [str(count) for count in self.counts[row]]
+                file.write(",".join(fields) + "\n")
+
+
+_PREDICTOR_FONT = None
+
+
+def predictor_font():
+    """SysFont scans the installed fonts, so the predictor's font is looked up once, off the main thread."""
+    global _PREDICTOR_FONT
+    if _PREDICTOR_FONT is None:
+        _PREDICTOR_FONT = BackgroundTask(pygame.font.SysFont, "Arial", 16)
+    return _PREDICTOR_FONT
+
+
+_PREDICTOR_BACKDROPS = {}
+
+
+def predictor_backdrop(size):
+    """The predictor's translucent yellow panel, built once per size."""
+    backdrop = _PREDICTOR_BACKDROPS.get(size)
+    if backdrop is None:
+        backdrop = pygame.Surface(size, pygame.SRCALPHA)
+        backdrop.fill((255, 255, 0, 100))
+        _PREDICTOR_BACKDROPS[size] = backdrop
+    return backdrop
+
+
+# Sprite name -> (file, scale). Scale is a multiplier of the image size or an explicit (width, height).
+SPRITE_SPECS = {
+    "player": ("Sprites/Player.png", 1),
+    "tank": ("Sprites/Tank.png", 3),
+    "assassin": ("Sprites/Assassin.png", 1),
+    "mage": ("Sprites/Mage.png", 2),
+    "boss": ("Sprites/Boss.png", (120, 120)),
+}
+
+
+def load_sprite(path, scale):
+    surface = pygame.image.load(path)
+    if isinstance(scale, tuple):
+        surface = pygame.transform.scale(surface, scale)
+    elif scale != 1:
+        surface = pygame.transform.scale(surface, (surface.get_width() * scale, surface.get_height() * scale))
+    return surface.convert_alpha()
+
+
+def flatten_background(image, size):
+    """Scales the colour-keyed background to `size`, flattened onto black so it is opaque."""
+    background = pygame.Surface(size).convert()
+    background.fill(BLACK)
+    background.blit(pygame.transform.scale(image, size), (0, 0))
+    return background
+
+
+class AssetBundle:
+    """Sprites, backgrounds and music packed into one memory-mapped file."""
+
+    def __init__(self, path=ASSET_BUNDLE_FILE, specs=SPRITE_SPECS, background_path=BACKGROUND_FILE,
+                 tracks=MUSIC_TRACKS):
+        self.path = path
+        self.specs = specs
+        self.background_path = background_path
+        self.tracks = tracks
+        self.data = None  # The mmap, while open
+        self.base = 0  # File offset the entries' offsets count from
+        self.entries = {}
+        self.lock = threading.RLock()  # The music prefetch reads while the loader thread may be rebuilding
+
+    def fingerprint(self):
+        """(size, mtime) of each source file that exists; a bundle also works with the sources gone."""
+        paths = {path for path, _ in self.specs.values()}
+        paths |= {self.background_path} | {path for path, _ in self.tracks.values()}
+        sources = {}
+        for path in sorted(paths):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            sources[path] = [stat.st_size, stat.st_mtime_ns]
+        return sources
+
+    def open(self):
+        """Maps the bundle; returns False if there is none or its sources have changed since it was built."""
+        with self.lock:
+            self.close()
+            try:
+                with open(self.path, "rb") as file:
+                    data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):  # Missing, unreadable or empty
+                return False
+            try:
+                magic = len(ASSET_BUNDLE_MAGIC)
+                if data[:magic] != ASSET_BUNDLE_MAGIC:
+                    raise ValueError("not an asset bundle")
+                (length,) = struct.unpack_from("<I", data, magic)
+                index = json.loads(data[magic + 4:magic + 4 + length])
+                recorded = index["sources"]
+                if any(recorded.get(path) != stamp for path, stamp in self.fingerprint().items()):
+                    raise ValueError("sources changed")
+            except (ValueError, KeyError, struct.error):
+                data.close()
+                return False
+            self.data = data
+            self.base = magic + 4 + length
+            self.entries = index["entries"]
+            return True
+
+    def close(self):
+        with self.lock:
+            if self.data is not None:
+                self.data.close()
+                self.data = None
+                self.entries = {}
+
+    def has(self, name):
+        return name in self.entries
+
+    def read(self, name):
+        """The bytes stored under `name`, or None if the bundle does not hold it."""
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is None:
+                return None
+            offset, length = entry[:2]
+            return self.data[self.base + offset:self.base + offset + length]
+
+    def surface(self, name, pixel_format):
+        """The stored pixels of `name` as a new surface, not yet converted for the display."""
+        width, height = self.entries[name][2:]
+        return pygame.image.frombuffer(self.read(name), (width, height), pixel_format)
+
+    def resolutions(self):
+        return [tuple(entry[2:]) for name, entry in self.entries.items() if name.startswith("background:")]
+
+    def build(self, resolutions):
+        """Writes a fresh bundle with a background for each (width, height) given, and maps it."""
+        with self.lock:
+            self.close()
+            entries = {}
+            blobs = []
+            offset = 0
+
+            def add(name, data, width=0, height=0):
+                nonlocal offset
+                entries[name] = [offset, len(data), width, height]
+                blobs.append(data)
+                offset += len(data)
+
+            for name, (path, scale) in self.specs.items():
+                sprite = load_sprite(path, scale)
+                add(f"sprite:{name}", pygame.image.tobytes(sprite, "RGBA"), *sprite.get_size())
+            image = pygame.image.load(self.background_path).convert()
+            for width, height in resolutions:
+                background = flatten_background(image, (width, height))
+                add(f"background:{width}x{height}", pygame.image.tobytes(background, "RGB"), width, height)
+            for path, _ in self.tracks.values():
+                with open(path, "rb") as file:
+                    add(f"music:{path}", file.read())
+
+            index = json.dumps({"sources": self.fingerprint(), "entries": entries}).encode()
+            with open(self.path + ".tmp", "wb") as file:
+                file.write(ASSET_BUNDLE_MAGIC + struct.pack("<I", len(index)) + index)
+                for data in blobs:
+                    file.write(data)
+            os.replace(self.path + ".tmp", self.path)
+            self.open()
+
+
+class AssetRegistry:
+    """Process-wide sprite and background cache, normally filled from the asset bundle."""
+
+    def __init__(self, specs, bundle):
+        self.specs = specs
+        self.bundle = bundle
+        self.surfaces = {}
+        self.backgrounds = {}  # (width, height) -> background flattened and scaled to that size
+        self.hits = 0
+        self.misses = 0  # Lookups that had to load the sprite because preload() had not
+
+    def sprite(self, name):
+        surface = self.surfaces.get(name)
+        if surface is not None:
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        path, scale = self.specs[name]
+        surface = load_sprite(path, scale)
+        self.surfaces[name] = surface
+        return surface
+
+    def background(self, size):
+        background = self.backgrounds.get(size)
+        if background is None:
+            key = f"background:{size[0]}x{size[1]}"
+            if self.bundle.has(key):
+                background = self.bundle.surface(key, "RGB").convert()
+            else:
+                background = flatten_background(pygame.image.load(self.bundle.background_path).convert(), size)
+            self.backgrounds[size] = background
+        return background
+
+    def preload(self, size, progress=None):
+        """Loads every sprite and the `size` background, building the bundle if needed."""
+        names = [name for name in self.specs if name not in self.surfaces]
+        total = len(names) + 1
+        bundle = self.bundle
+        if names or size not in self.backgrounds:
+            key = f"background:{size[0]}x{size[1]}"
+            try:
+                if not (bundle.data is not None or bundle.open()) or not bundle.has(key):
+                    resolutions = [other for other in bundle.resolutions() if other != size]
+                    bundle.build(resolutions[-(ASSET_BUNDLE_RESOLUTIONS - 1):] + [size])
+            except (OSError, pygame.error) as e:
+                print(f"Error building asset bundle: {e}")
+                bundle.close()  # Load straight from the source files instead
+
+        for done, name in enumerate(names, 1):
+            key = f"sprite:{name}"
+            if bundle.has(key):
+                self.surfaces[name] = bundle.surface(key, "RGBA").convert_alpha()
+            else:
+                self.surfaces[name] = load_sprite(*self.specs[name])
+            if progress:
+                progress(done, total)
+        background = self.background(size)
+        if progress:
+            progress(total, total)
+        return background
+
+    def stats(self):
+        return {"loaded": len(self.surfaces), "hits": self.hits, "misses": self.misses}
+
+
+ASSETS = AssetRegistry(SPRITE_SPECS, AssetBundle())
+
+
+class RotationCache:
+    """Rotated copies of sprites keyed by (sprite, quantized angle), least recently used evicted first."""
+
+    def __init__(self, steps=ROTATION_STEPS, max_bytes=ROTATION_CACHE_BYTES):
+        self.steps = steps
+        self.step_angle = 360 / steps
+        self.max_bytes = max_bytes
+        self.surfaces = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def rotate(self, sprite, angle):
+        key = (sprite, round(angle / self.step_angle) % self.steps)
+        rotated = self.surfaces.get(key)
+        if rotated is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return rotated
+
+        self.misses += 1
+        rotated = pygame.transform.rotate(sprite, key[1] * self.step_angle)
+        self.surfaces[key] = rotated
+        self.size += rotated.get_width() * rotated.get_height() * rotated.get_bytesize()
+        while self.size > self.max_bytes and len(self.surfaces) > 1:
+            _, evicted = self.surfaces.popitem(last=False)
+            self.size -= evicted.get_width() * evicted.get_height() * evicted.get_bytesize()
+        return rotated
+
+    def stats(self):
+        return {"entries": len(self.surfaces), "bytes": self.size, "hits": self.hits, "misses": self.misses}
+
+
+ROTATIONS = RotationCache()
+
+
+class TextCache:
+    """Rendered text surfaces keyed by (font, text, color), least recently used dropped first."""
+
+    def __init__(self, max_entries=TEXT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color):
+        key = (font, text, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def stats(self):
+        return {"entries": len(self.surfaces), "hits": self.hits, "misses": self.misses}
+
+
+TEXTS = TextCache()
+
+
+class AudioManager:
+    """Plays the music of the game's current state, fading between streamed tracks."""
+
+    def __init__(self, tracks=MUSIC_TRACKS, following=MUSIC_NEXT, volume=MUSIC_VOLUME, fade_ms=MUSIC_FADE_MS):
+        self.tracks = tracks
+        self.following = following
+        self.volume = volume
+        self.fade_ms = fade_ms
+        self.files = {}  # Track path -> BackgroundTask reading its bytes
+        self.state = None
+        self.pending = None  # State whose track starts once the current one has faded out
+        self.enabled = True
+
+    def prefetch(self, state):
+        path = self.tracks[state][0]
+        if path not in self.files:
+            self.files[path] = BackgroundTask(self.read, path)
+
+    @staticmethod
+    def read(path):
+        data = ASSETS.bundle.read(f"music:{path}")
+        if data is None:
+            with open(path, "rb") as file:
+                data = file.read()
+        return data
+
+    def update(self, state):
+        if not self.enabled:
+            return
+        try:
+            if state != self.state:
+                self.state = state
+                self.pending = state
+                for following in self.following[state]:
+                    self.prefetch(following)
+                if pygame.mixer.music.get_busy():
+                    pygame.mixer.music.fadeout(self.fade_ms)
+            if self.pending is not None and not pygame.mixer.music.get_busy():
+                self.start(self.pending)
+                self.pending = None
+        except pygame.error as e:  # No audio device
+            print(f"Error playing music: {e}")
+            self.enabled = False
+
+    def start(self, state):
+        path, loops = self.tracks[state]
+        task = self.files.get(path)
+        if task is not None and task.done() and task.error is None:
+            pygame.mixer.music.load(io.BytesIO(task.value), os.path.splitext(path)[1][1:])
+        else:
+            pygame.mixer.music.load(path)  # Not prefetched (yet); stream it from disk
+        pygame.mixer.music.set_volume(self.volume)
+        pygame.mixer.music.play(loops, fade_ms=self.fade_ms)
+
+
+AUDIO = AudioManager()
+
+
+class RenderBatcher:
+    """Collects a frame's draws into ordered layers and submits each with one Surface.blits call."""
+    SPRITES, BULLETS, BARS = range(3)
+
+    def __init__(self):
+        self.layers = ([], [], [])
+        self.stamps = {}
+
+    def stamp(self, key, size, draw):
+        surface = self.stamps.get(key)
+        if surface is None:
+            surface = pygame.Surface(size).convert()
+            colorkey = WHITE if key[1] == BLACK else BLACK
+            surface.fill(colorkey)
+            draw(surface)
+            surface.set_colorkey(colorkey, pygame.RLEACCEL)
+            self.stamps[key] = surface
+        return surface
+
+    def circle_stamp(self, color, radius, width=0):
+        return self.stamp(("circle", color, radius, width), (2 * radius, 2 * radius),
+                          lambda surface: pygame.draw.circle(surface, color, (radius, radius), radius, width))
+
+    def add(self, layer, surface, dest, area=None):
+        self.layers[layer].append((surface, dest) if area is None else (surface, dest, area))
+
+    def circle(self, layer, color, center, radius, width=0):
+        x, y = center
+        self.layers[layer].append((self.circle_stamp(color, radius, width), (int(x) - radius, int(y) - radius)))
+
+    def circles(self, layer, color, radius, xs, ys):
+        """Filled circles centred on the integer coordinate lists `xs`, `ys`."""
+        stamp = self.circle_stamp(color, radius)
+        self.layers[layer].extend([(stamp, (x - radius, y - radius)) for x, y in zip(xs, ys)])
+
+    def rect(self, layer, color, x, y, width, height, border=0, fill=1.0):
+        """A rect (outlined if `border`), of which only the leftmost `fill` fraction is drawn."""
+        width, height = int(width), int(height)
+        stamp = self.stamp(("rect", color, width, height, border), (width, height),
+                           lambda surface: pygame.draw.rect(surface, color, (0, 0, width, height), border))
+        area = None if fill >= 1 else (0, 0, max(0, int(width * fill)), height)
+        self.add(layer, stamp, (int(x), int(y)), area)
+
+    def flush(self, screen, doreturn=False):
+        """Draws and clears every layer; with `doreturn` returns the rects that were drawn."""
+        rects = []
+        for layer in self.layers:
+            if layer:
+                drawn = screen.blits(layer, doreturn)
+                if doreturn:
+                    rects += drawn
+                layer.clear()
+        return rects
 
 
 class UpgradeType(Enum):
@@ -57,12 +704,6 @@ class UpgradeType(Enum):
     UTILITY = "utility"
 
 
-class BossState(Enum):
-    PHASE1 = auto()
-    PHASE2 = auto()
-    PHASE3 = auto()
-
-
 class Upgrade:
     def __init__(self, name, description, upgrade_type, effect_function):
         self.name = name
@@ -72,11 +713,64 @@ class Upgrade:
         self.level = 0
 
 
+class FreeList:
+    """Recycles dead objects of one slotted class instead of handing them back to the allocator."""
+
+    def __init__(self, cls, limit=4096):
+        self.cls = cls
+        self.limit = limit
+        self.free = []
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self, *args, **kwargs):
+        if self.free:
+            item = self.free.pop()
+            item.reset(*args, **kwargs)
+            self.reused += 1
+            return item
+        self.created += 1
+        return self.cls(*args, **kwargs)
+
+    def release(self, item):
+        if type(item) is self.cls and len(self.free) < self.limit:
+            self.free.append(item)
+
+    def release_all(self, items):
+        """Empties the list `items`, recycling everything in it."""
+        for item in items:
+            self.release(item)
+        items.clear()
+
+    def sweep(self, items, dead):
+        """Removes and recycles items[i] for every true dead[i], in place."""
+        kept = 0
+        for item, is_dead in zip(items, dead):
+            if is_dead:
+                self.release(item)
+            else:
+                items[kept] = item
+                kept += 1
+        del items[kept:]
+
+    def stats(self):
+        return {"free": len(self.free), "created": self.created, "reused": self.reused}
+
+
 class Bullet:
-    def __init__(self, x, y, target_x, target_y, speed=10, color=GREEN,
-                 homing=False, piercing=False, burst=False, damage=10.0, lifespan=-1, max_pierce=2):
+    __slots__ = ("x", "y", "prev_x", "prev_y", "radius", "speed", "color", "homing", "piercing", "burst",
+                 "enemies_hit", "max_pierce", "ricochet_count", "temporal_decay", "damage", "lifespan", "age",
+                 "dx", "dy")
+
+    def __init__(self, *args, **kwargs):
+        self.reset(*args, **kwargs)
+
+    def reset(self, x, y, target_x, target_y, speed=10, color=GREEN,
+              homing=False, piercing=False, burst=False, damage=10.0, lifespan=-1, max_pierce=2):
         self.x = x
         self.y = y
+        self.prev_x = x
+        self.prev_y = y
         self.radius = 5
         self.speed = speed
         self.color = color
@@ -125,27 +819,363 @@ class Bullet:
 
         self.age += 1  # Increment age each frame
 
-    def draw(self, screen):
-        pygame.draw.circle(screen, self.color, (int(self.x), int(self.y)), self.radius)
+    def draw(self, batch, alpha=1.0):
+        x, y = lerp(self.prev_x, self.x, alpha), lerp(self.prev_y, self.y, alpha)
+        batch.circle(batch.BULLETS, self.color, (x, y), self.radius)
 
-    def is_off_screen(self):
-        return (self.x < 0 or self.x > SCREEN_WIDTH or
-                self.y < 0 or self.y > SCREEN_HEIGHT)
+    def is_off_screen(self, width, height):
+        return (self.x < 0 or self.x > width or
+                self.y < 0 or self.y > height)
 
     def is_expired(self):
         return self.age >= self.lifespan  # Check if the bullet has exceeded its lifespan
 
 
+BULLETS = FreeList(Bullet)
+
+
+class ArrayStore:
+    """Base for structure-of-arrays storage: FIELDS arrays of `capacity` slots, [0, count) live."""
+    FIELDS = ()
+
+    def __len__(self):
+        return self.count
+
+    def to_arrays(self, prefix):
+        """The live slots of every field, keyed `prefix` + field name, for a snapshot."""
+        return {prefix + name: getattr(self, name)[:self.count] for name in self.FIELDS}
+
+    def load_arrays(self, arrays, prefix):
+        """Replaces the contents with live slots saved by to_arrays()."""
+        count = len(arrays[prefix + self.FIELDS[0]])
+        self.count = 0
+        while self.capacity < count:
+            self._grow()
+        for name in self.FIELDS:
+            getattr(self, name)[:count] = arrays[prefix + name]
+        self.count = count
+
+    def _grow(self):
+        self.capacity *= 2
+        for name in self.FIELDS:
+            old = getattr(self, name)
+            new = np.zeros(self.capacity, dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def compact(self, keep):
+        """Keeps the live slots flagged in `keep` (a bool mask over [0, count)), preserving order."""
+        n = self.count
+        survivors = int(np.count_nonzero(keep))
+        if survivors == n:
+            return
+        for name in self.FIELDS:
+            array = getattr(self, name)
+            array[:survivors] = array[:n][keep]
+        self.count = survivors
+
+
+class BulletPool(ArrayStore):
+    """Preallocated structure-of-arrays storage for projectiles; live bullets occupy slots [0, count)."""
+    HOMING = 1
+    PIERCING = 2
+    TEMPORAL_DECAY = 4
+
+    FIELDS = ("x", "y", "prev_x", "prev_y", "dx", "dy", "speed", "damage", "age", "lifespan", "enemies_hit",
+              "max_pierce", "flags", "target", "retarget", "color")
+
+    def __init__(self, capacity=256, radius=5, color=GREEN):
+        self.capacity = capacity
+        self.count = 0
+        self.radius = radius
+        self.palette = [color]
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.prev_x = np.zeros(capacity)
+        self.prev_y = np.zeros(capacity)
+        self.dx = np.zeros(capacity)
+        self.dy = np.zeros(capacity)
+        self.speed = np.zeros(capacity)
+        self.damage = np.zeros(capacity)
+        self.age = np.zeros(capacity, dtype=np.int32)
+        self.lifespan = np.zeros(capacity, dtype=np.int32)  # -1 means the bullet never expires
+        self.enemies_hit = np.zeros(capacity, dtype=np.int32)
+        self.max_pierce = np.zeros(capacity, dtype=np.int32)
+        self.flags = np.zeros(capacity, dtype=np.uint8)
+        self.target = np.zeros(capacity, dtype=np.int64)  # uid of the enemy a homing bullet tracks
+        self.retarget = np.zeros(capacity, dtype=np.int32)  # frames left before the target is re-acquired
+        self.color = np.zeros(capacity, dtype=np.uint8)  # Index into the palette
+
+    def spawn(self, x, y, target_x, target_y, speed=10, damage=10.0, lifespan=-1, max_pierce=2,
+              homing=False, piercing=False, temporal_decay=False):
+        if self.count == self.capacity:
+            self._grow()
+        i = self.count
+        angle = math.atan2(target_y - y, target_x - x)
+        self.x[i] = self.prev_x[i] = x
+        self.y[i] = self.prev_y[i] = y
+        self.dx[i] = math.cos(angle) * speed
+        self.dy[i] = math.sin(angle) * speed
+        self.speed[i] = speed
+        self.damage[i] = damage
+        self.age[i] = 0
+        self.lifespan[i] = lifespan
+        self.enemies_hit[i] = 0
+        self.max_pierce[i] = max_pierce
+        self.flags[i] = ((self.HOMING if homing else 0) | (self.PIERCING if piercing else 0) |
+                         (self.TEMPORAL_DECAY if temporal_decay else 0))
+        self.target[i] = -1
+        self.retarget[i] = 0
+        self.color[i] = 0
+        self.count += 1
+
+    def spawn_volley(self, x, y, ux, uy, speed, damage=10.0, lifespan=-1, color=None):
+        """Spawns one plain bullet per entry of the unit direction arrays `ux`, `uy` in one write."""
+        k = len(ux)
+        while self.count + k > self.capacity:
+            self._grow()
+        if color is None:
+            color = self.palette[0]
+        if color not in self.palette:
+            self.palette.append(color)
+        new = slice(self.count, self.count + k)
+        self.x[new] = self.prev_x[new] = x
+        self.y[new] = self.prev_y[new] = y
+        self.dx[new] = ux * speed
+        self.dy[new] = uy * speed
+        self.speed[new] = speed
+        self.damage[new] = damage
+        self.age[new] = 0
+        self.lifespan[new] = lifespan
+        self.enemies_hit[new] = 0
+        self.max_pierce[new] = 0
+        self.flags[new] = 0
+        self.target[new] = -1
+        self.retarget[new] = 0
+        self.color[new] = self.palette.index(color)
+        self.count += k
+
+    def touching(self, x, y, radius):
+        """Mask over the live bullets that overlap the circle of `radius` around (x, y)."""
+        n = self.count
+        reach = radius + self.radius
+        return (self.x[:n] - x) ** 2 + (self.y[:n] - y) ** 2 < reach * reach
+
+    def move(self, enemies=None):
+        n = self.count
+        if n == 0:
+            return
+
+        if enemies:
+            homing = np.flatnonzero(self.flags[:n] & self.HOMING)
+            if homing.size:
+                self.home(homing, enemies)
+
+        self.x[:n] += self.dx[:n]
+        self.y[:n] += self.dy[:n]
+        self.age[:n] += 1  # Increment age each frame
+
+    def home(self, homing, enemies):
+        """Steers the homing bullets, re-acquiring targets through a SpatialHash only when needed."""
+        count = len(enemies)
+        enemy_x = np.fromiter((enemy.x for enemy in enemies), dtype=np.float64, count=count)
+        enemy_y = np.fromiter((enemy.y for enemy in enemies), dtype=np.float64, count=count)
+        uids = np.fromiter((enemy.uid for enemy in enemies), dtype=np.int64, count=count)
+
+        # Map the retained target uids back to positions in this frame's enemy list
+        order = np.argsort(uids, kind="stable")
+        sorted_uids = uids[order]
+        targets = self.target[homing]
+        found = np.minimum(np.searchsorted(sorted_uids, targets), count - 1)
+        target_index = order[found]
+        lost = (sorted_uids[found] != targets) | (self.retarget[homing] <= 0)
+
+        if lost.any():
+            xs = enemy_x.tolist()
+            ys = enemy_y.tolist()
+            grid = SpatialHash()
+            for i in range(count):
+                grid.insert(i, xs[i], ys[i])
+            reacquire = homing[lost]
+            nearest = np.array([grid.nearest(x, y, xs, ys)
+                                for x, y in zip(self.x[reacquire].tolist(), self.y[reacquire].tolist())],
+                               dtype=np.int64)
+            target_index[lost] = nearest
+            self.target[reacquire] = uids[nearest]
+            self.retarget[reacquire] = HOMING_RETARGET_FRAMES
+        self.retarget[homing] -= 1
+
+        self.steer(homing, enemy_x[target_index] - self.x[homing], enemy_y[target_index] - self.y[homing])
+
+    def steer(self, indices, to_x, to_y):
+        """Gradually turns the given bullets towards the (to_x, to_y) offsets."""
+        speed = self.speed[indices]
+        distance = np.hypot(to_x, to_y)
+        safe = np.where(distance > 0, distance, 1.0)
+        unit_x = np.where(distance > 0, to_x / safe, 1.0)  # atan2(0, 0) == 0 points along +x
+        unit_y = np.where(distance > 0, to_y / safe, 0.0)
+
+        # Gradual homing
+        dx = self.dx[indices] * 0.9 + unit_x * speed * 0.1
+        dy = self.dy[indices] * 0.9 + unit_y * speed * 0.1
+
+        # Normalize speed
+        norm = np.hypot(dx, dy)
+        self.dx[indices] = dx / norm * speed
+        self.dy[indices] = dy / norm * speed
+
+    def cull(self, width, height):
+        """Drops bullets that left the width x height arena or outlived their lifespan."""
+        n = self.count
+        if n == 0:
+            return
+        x = self.x[:n]
+        y = self.y[:n]
+        keep = (x >= 0) & (x <= width) & (y >= 0) & (y <= height)
+        lifespan = self.lifespan[:n]
+        keep &= (lifespan < 0) | (self.age[:n] < lifespan)
+        self.compact(keep)
+
+    def update(self, width, height, enemies=None):
+        self.move(enemies)
+        self.cull(width, height)
+
+    def clear(self):
+        self.count = 0
+
+    def draw(self, batch, alpha=1.0):
+        n = self.count
+        x = (lerp(self.prev_x[:n], self.x[:n], alpha) if alpha != 1 else self.x[:n]).astype(np.int32)
+        y = (lerp(self.prev_y[:n], self.y[:n], alpha) if alpha != 1 else self.y[:n]).astype(np.int32)
+        if len(self.palette) == 1:
+            batch.circles(batch.BULLETS, self.palette[0], self.radius, x.tolist(), y.tolist())
+            return
+        colors = self.color[:n]
+        for index, color in enumerate(self.palette):
+            mask = colors == index
+            if mask.any():
+                batch.circles(batch.BULLETS, color, self.radius, x[mask].tolist(), y[mask].tolist())
+
+    def remember_positions(self):
+        n = self.count
+        self.prev_x[:n] = self.x[:n]
+        self.prev_y[:n] = self.y[:n]
+
+
+class SpatialHash:
+    """Uniform grid broadphase. Each item is bucketed by the cell holding its centre."""
+    KEY_STRIDE = 1 << 20  # Packs (cell_x, cell_y) into one int64 for vectorized lookups
+
+    def __init__(self, cell_size=GRID_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.bounds = None  # (min_x, max_x, min_y, max_y) of occupied cells, computed on demand
+
+    def clear(self):
+        self.cells.clear()
+        self.bounds = None
+
+    def ring_limit(self, cx, cy):
+        """Largest ring (in cells) around (cx, cy) that can still hold an item."""
+        if self.bounds is None:
+            xs = [key[0] for key in self.cells]
+            ys = [key[1] for key in self.cells]
+            self.bounds = (min(xs), max(xs), min(ys), max(ys))
+        min_x, max_x, min_y, max_y = self.bounds
+        return max(cx - min_x, max_x - cx, cy - min_y, max_y - cy)
+
+    def cell(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def insert(self, item, x, y):
+        key = self.cell(x, y)
+        bucket = self.cells.get(key)
+        if bucket is None:
+            self.cells[key] = [item]
+            self.bounds = None
+        else:
+            bucket.append(item)
+
+    def move(self, item, old_x, old_y, new_x, new_y):
+        """Re-buckets an item after it moved from (old_x, old_y) to (new_x, new_y)."""
+        old_key = self.cell(old_x, old_y)
+        new_key = self.cell(new_x, new_y)
+        if old_key != new_key:
+            bucket = self.cells[old_key]
+            bucket.remove(item)
+            if not bucket:
+                del self.cells[old_key]
+                self.bounds = None
+            self.insert(item, new_x, new_y)
+
+    def query(self, x, y):
+        """Returns the items in the 3x3 block of cells around (x, y)."""
+        cx, cy = self.cell(x, y)
+        cells = self.cells
+        found = []
+        for i in (cx - 1, cx, cx + 1):
+            for j in (cy - 1, cy, cy + 1):
+                bucket = cells.get((i, j))
+                if bucket:
+                    found.extend(bucket)
+        return found
+
+    def nearest(self, x, y, xs, ys):
+        """Returns the index of the item closest to (x, y), searching outwards ring by ring."""
+        if not self.cells:
+            return None
+        cx, cy = self.cell(x, y)
+        cells = self.cells
+        limit = self.ring_limit(cx, cy)
+        best = None
+        best_distance = float('inf')
+        ring = 0
+        while ring <= limit:
+            if ring == 0:
+                keys = [(cx, cy)]
+            else:
+                keys = [(i, cy - ring) for i in range(cx - ring, cx + ring + 1)]
+                keys += [(i, cy + ring) for i in range(cx - ring, cx + ring + 1)]
+                keys += [(cx - ring, j) for j in range(cy - ring + 1, cy + ring)]
+                keys += [(cx + ring, j) for j in range(cy - ring + 1, cy + ring)]
+            for key in keys:
+                bucket = cells.get(key)
+                if bucket:
+                    for item in bucket:
+                        distance = (xs[item] - x) ** 2 + (ys[item] - y) ** 2
+                        if distance < best_distance or (distance == best_distance and item < best):
+                            best = item
+                            best_distance = distance
+            # Anything in a further ring is at least ring * cell_size away
+            if best is not None and best_distance < (ring * self.cell_size) ** 2:
+                break
+            ring += 1
+        return best
+
+    def near_items(self, xs, ys):
+        """Vectorized test of which points have at least one item in their 3x3 block of cells."""
+        if not self.cells:
+            return np.zeros(len(xs), dtype=bool)
+        stride = self.KEY_STRIDE
+        hot = np.array([(cx + i) * stride + cy + j
+                        for cx, cy in self.cells for i in (-1, 0, 1) for j in (-1, 0, 1)], dtype=np.int64)
+        keys = (np.floor_divide(xs, self.cell_size).astype(np.int64) * stride +
+                np.floor_divide(ys, self.cell_size).astype(np.int64))
+        return np.isin(keys, hot)
+
+
 class Player:
     def __init__(self, x, y):
         self.x = x
         self.y = y
+        self.prev_x = x  # Position at the start of the last step, for interpolated drawing
+        self.prev_y = y
         self.radius = 20
         self.speed = 5
         self.health = 100
         self.max_health = 100
         self.color = GREEN
-        self.bullets = []
+        self.bullets = BulletPool()
         self.shoot_cooldown = 0
         self.base_shoot_delay = 10
         self.shoot_delay = self.base_shoot_delay
@@ -157,7 +1187,6 @@ class Player:
         self.growth_rate = 0.05  # Growth rate of XP required per level
         self.exp_to_level = self.calculate_xp_required(self.level)
         self.angle = 0  # Angle for rotation
-        self.sprite = pygame.image.load("Sprites/player.png")  # Load player sprite
         self.base_damage = 10.0
 
         # Upgrade flags
@@ -179,14 +1208,14 @@ class Player:
         self.upgrades.append(upgrade)
         upgrade.effect(self)
 
-    def move(self, keys):
-        if keys[pygame.K_w] and self.y - self.speed > 0:
+    def move(self, inputs, width, height):
+        if inputs.up and self.y - self.speed > 0:
             self.y -= self.speed
-        if keys[pygame.K_s] and self.y + self.speed < SCREEN_HEIGHT:
+        if inputs.down and self.y + self.speed < height:
             self.y += self.speed
-        if keys[pygame.K_a] and self.x - self.speed > 0:
+        if inputs.left and self.x - self.speed > 0:
             self.x -= self.speed
-        if keys[pygame.K_d] and self.x + self.speed < SCREEN_WIDTH:
+        if inputs.right and self.x + self.speed < width:
             self.x += self.speed
 
     def auto_shoot(self, mouse_x, mouse_y):
@@ -210,19 +1239,17 @@ class Player:
                     rotated_dy = dx * math.sin(rad_angle) + dy * math.cos(rad_angle)
                     target_x = self.x + rotated_dx
                     target_y = self.y + rotated_dy
-                    bullet = Bullet(self.x, self.y, target_x, target_y,
-                                    homing=self.homing_rounds,
-                                    piercing=True if self.piercing_level > 0 else False,
-                                    max_pierce=2 + (2 * self.piercing_level),
-                                    damage=self.base_damage * self.damage_multiplier)  # Apply damage
-                    self.bullets.append(bullet)
+                    self.bullets.spawn(self.x, self.y, target_x, target_y,
+                                       homing=self.homing_rounds,
+                                       piercing=True if self.piercing_level > 0 else False,
+                                       max_pierce=2 + (2 * self.piercing_level),
+                                       damage=self.base_damage * self.damage_multiplier)  # Apply damage
                 self.burst_fire_counter = 0
             else:
-                bullet = Bullet(self.x, self.y, mouse_x, mouse_y,
-                                homing=self.homing_rounds,
-                                piercing=self.piercing_shots,
-                                damage=self.base_damage * self.damage_multiplier)  # Apply damage
-                self.bullets.append(bullet)
+                self.bullets.spawn(self.x, self.y, mouse_x, mouse_y,
+                                   homing=self.homing_rounds,
+                                   piercing=self.piercing_shots,
+                                   damage=self.base_damage * self.damage_multiplier)  # Apply damage
                 if self.burst_fire_counter != -1:
                     self.burst_fire_counter += 1
 
@@ -251,7 +1278,7 @@ class Player:
         print(f"Leveled up to level {self.level}!")  # Debug message
         return True
 
-    def update(self, enemies):
+    def update(self, enemies, mouse_x, mouse_y, width, height):
         if self.shoot_cooldown > 0:
             self.shoot_cooldown -= 1
 
@@ -264,50 +1291,117 @@ class Player:
             elif not self.shield_active:
                 self.shield_active = True
 
-        for bullet in self.bullets[:]:
-            bullet.move(enemies)
-            if bullet.is_off_screen():
-                if bullet in self.bullets:
-                    self.bullets.remove(bullet)
+        self.bullets.update(width, height, enemies)
 
         # Calculate angle towards the mouse cursor
-        mouse_x, mouse_y = pygame.mouse.get_pos()
         dx = mouse_x - self.x
         dy = mouse_y - self.y
         self.angle = math.degrees(math.atan2(-dy, dx))  # Invert dy for correct rotation
 
-    def draw(self, screen):
+    def draw(self, batch, alpha=1.0):
+        x, y = lerp(self.prev_x, self.x, alpha), lerp(self.prev_y, self.y, alpha)
         # Rotate the sprite
-        rotated_sprite = pygame.transform.rotate(self.sprite, self.angle)
-        sprite_rect = rotated_sprite.get_rect(center=(self.x, self.y))  # Center the sprite
+        rotated_sprite = ROTATIONS.rotate(ASSETS.sprite("player"), self.angle)
+        sprite_rect = rotated_sprite.get_rect(center=(x, y))  # Center the sprite
 
         # Draw the rotated sprite
-        screen.blit(rotated_sprite, sprite_rect.topleft)
+        batch.add(batch.SPRITES, rotated_sprite, sprite_rect.topleft)
 
         # Draw health bar
-        pygame.draw.rect(screen, RED, (self.x - 25, self.y - 30, 50, 5))
-        pygame.draw.rect(screen, GREEN, (self.x - 25, self.y - 30, 50 * (self.health / self.max_health), 5))
+        batch.rect(batch.BARS, RED, x - 25, y - 30, 50, 5)
+        batch.rect(batch.BARS, GREEN, x - 25, y - 30, 50, 5, fill=self.health / self.max_health)
 
         # Draw shield if active
         if self.shield_active:
-            pygame.draw.circle(screen, CYAN, (self.x, self.y), self.radius + 5, 2)
+            batch.circle(batch.SPRITES, CYAN, (x, y), self.radius + 5, 2)
 
         # Draw bullets
-        for bullet in self.bullets:
-            bullet.draw(screen)
+        self.bullets.draw(batch, alpha)
 
         # Draw experience bar at the bottom of the screen
         exp_bar_width = 200
         exp_bar_height = 20
         exp_progress = self.experience / self.exp_to_level
-        pygame.draw.rect(screen, WHITE, (SCREEN_WIDTH // 2 - exp_bar_width // 2,
-                                         SCREEN_HEIGHT - 30, exp_bar_width, exp_bar_height), 2)
-        pygame.draw.rect(screen, BLUE, (SCREEN_WIDTH // 2 - exp_bar_width // 2,
-                                        SCREEN_HEIGHT - 30,
-                                        exp_bar_width * exp_progress, exp_bar_height))
+        batch.rect(batch.BARS, WHITE, SCREEN_WIDTH // 2 - exp_bar_width // 2, SCREEN_HEIGHT - 30,
+                   exp_bar_width, exp_bar_height, border=2)
+        batch.rect(batch.BARS, BLUE, SCREEN_WIDTH // 2 - exp_bar_width // 2, SCREEN_HEIGHT - 30,
+                   exp_bar_width, exp_bar_height, fill=exp_progress)
+
+
+def upgrade_burst_fire(player):
+    player.burst_fire_level += 1
+    if player.burst_fire_counter == -1:
+        player.burst_fire_counter = 0
+
+
+def upgrade_homing(player):
+    player.homing_rounds = True
+
+
+def upgrade_piercing(player):
+    player.piercing_level += 1
+
+
+def increase_fire_rate(player):
+    player.shoot_delay *= 0.75
+
+
+def increase_damage(player):
+    player.damage_multiplier *= 1.25  # Increase damage by 25%
+
+
+def add_shield(player):
+    player.has_energy_shield = True
+    player.shield_active = True
+    player.shield_cooldown = 0
+
+
+def add_nanobot_repair(player):
+    player.has_nanobot_repair = True
+
+
+def add_temporal_decay(player):
+    player.temporal_decay = True
+
+
+def increase_speed(player):
+    player.speed *= 1.2  # Increase speed by 20%
+
+
+def increase_health(player):
+    player.max_health *= 1.2  # Increase max_health by 20%
+    player.health *= 1.2  # Increase health by 20%
+
+
+def create_upgrades():
+    """All possible upgrades. Snapshots refer to them by name."""
+    return [
+        Upgrade("Burst Fire", "Every third shot fires bullets in a spread pattern",
+                UpgradeType.OFFENSIVE, upgrade_burst_fire),
+        Upgrade("Homing Rounds", "Bullets slightly track nearest enemy",
+                UpgradeType.OFFENSIVE, upgrade_homing),
+        Upgrade("Piercing Shots", "Bullets pierce through enemies",
+                UpgradeType.OFFENSIVE, upgrade_piercing),
+        Upgrade("Rate Overdrive", "25% faster fire rate",
+                UpgradeType.OFFENSIVE, increase_fire_rate),
+        Upgrade("Enhanced Damage", "Increase bullet damage by 25%",
+                UpgradeType.OFFENSIVE, increase_damage),
+        Upgrade("Energy Shield", "Absorb one hit every 10 seconds",
+                UpgradeType.DEFENSIVE, add_shield),
+        Upgrade("Nanobot Repair", "Slowly regenerate health",
+                UpgradeType.DEFENSIVE, add_nanobot_repair),
+        Upgrade("Temporal Decay", "Bullets slow enemies briefly",
+                UpgradeType.OFFENSIVE, add_temporal_decay),
+        Upgrade("I AM SPEED", "Increase speed by 20%",
+                UpgradeType.UTILITY, increase_speed),
+        Upgrade("League Of Tanks", "Increase health by 20%",
+                UpgradeType.UTILITY, increase_health)
+    ]
 
 
 class UpgradeMenu:
+    """Shows the upgrade options the simulation offers and reports the player's pick."""
+
     def __init__(self, screen):
         self.screen = screen
         self.options = []
@@ -315,59 +1409,14 @@ class UpgradeMenu:
         self.font = pygame.font.Font(None, 32)
         self.visible = False
 
-        # Define all possible upgrades
-        self.all_upgrades = [
-            Upgrade("Burst Fire", "Every third shot fires bullets in a spread pattern",
-                    UpgradeType.OFFENSIVE, lambda player: self.upgrade_burst_fire(player)),
-            Upgrade("Homing Rounds", "Bullets slightly track nearest enemy",
-                    UpgradeType.OFFENSIVE, lambda player: setattr(player, 'homing_rounds', True)),
-            Upgrade("Piercing Shots", "Bullets pierce through enemies",
-                    UpgradeType.OFFENSIVE, lambda player: self.upgrade_piercing(player)),
-            Upgrade("Rate Overdrive", "25% faster fire rate",
-                    UpgradeType.OFFENSIVE, lambda player: self.increase_fire_rate(player)),
-            Upgrade("Enhanced Damage", "Increase bullet damage by 25%",
-                    UpgradeType.OFFENSIVE, lambda player: self.increase_damage(player)),
-            Upgrade("Energy Shield", "Absorb one hit every 10 seconds",
-                    UpgradeType.DEFENSIVE, lambda player: self.add_shield(player)),
-            Upgrade("Nanobot Repair", "Slowly regenerate health",
-                    UpgradeType.DEFENSIVE, lambda player: setattr(player, 'has_nanobot_repair', True)),
-            Upgrade("Temporal Decay", "Bullets slow enemies briefly",
-                    UpgradeType.OFFENSIVE, lambda player: setattr(player, 'temporal_decay', True)),
-            Upgrade("I AM SPEED", "Increase speed by 20%",
-                    UpgradeType.UTILITY, lambda player: self.increase_speed(player)),
-            Upgrade("League Of Tanks", "Increase health by 20%",
-                    UpgradeType.UTILITY, lambda player: self.increase_health(player))
-        ]
-
-    def upgrade_burst_fire(self, player):
-        player.burst_fire_level += 1
-        if player.burst_fire_counter == -1:
-            player.burst_fire_counter = 0
-
-    def upgrade_piercing(self, player):
-        player.piercing_level += 1
-
-    def increase_fire_rate(self, player):
-        player.shoot_delay *= 0.75
-
-    def increase_health(self, player):
-        player.max_health *= 1.2  # Increase max_health by 20%
-        player.health *= 1.2  # Increase health by 20%
-
-    def increase_speed(self, player):
-        player.speed *= 1.2  # Increase speed by 20%
-
-    def increase_damage(self, player):
-        player.damage_multiplier *= 1.25  # Increase damage by 25%
-
-    def add_shield(self, player):
-        player.has_energy_shield = True
-        player.shield_active = True
-        player.shield_cooldown = 0
-
-    def show(self):
+        # Semi-transparent backdrop, built once
+        self.shade = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        self.shade.set_alpha(128)
+        self.shade.fill(BLACK)
+
+    def show(self, options):
         self.visible = True
-        self.options = random.sample(self.all_upgrades, min(3, len(self.all_upgrades)))
+        self.options = options
         self.selected_index = 0
         pygame.event.clear()  # Clear existing events
 
@@ -378,60 +1427,50 @@ class UpgradeMenu:
         if not self.visible:
             return
 
-        # Draw semi-transparent background
-        s = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-        s.set_alpha(128)
-        s.fill(BLACK)
-        self.screen.blit(s, (0, 0))
+        self.screen.blit(self.shade, (0, 0))
 
         # Draw upgrade options
         for i, upgrade in enumerate(self.options):
             color = YELLOW if i == self.selected_index else WHITE
             text = f"{upgrade.name}: {upgrade.description}"
-            text_surface = self.font.render(text, True, color)
+            text_surface = TEXTS.render(self.font, text, color)
             x = SCREEN_WIDTH // 2 - text_surface.get_width() // 2
             y = SCREEN_HEIGHT // 2 - len(self.options) * 30 + i * 60
             self.screen.blit(text_surface, (x, y))
 
-    def handle_input(self, event, player):
+    def handle_input(self, event):
+        """Returns the index of the chosen option once the player confirms one, otherwise None."""
         if not self.visible:
-            return False
+            return None
         if event.type == pygame.KEYDOWN:
             if event.key == pygame.K_UP:
                 self.selected_index = (self.selected_index - 1) % len(self.options)
             elif event.key == pygame.K_DOWN:
                 self.selected_index = (self.selected_index + 1) % len(self.options)
             elif event.key == pygame.K_RETURN:
-                selected_upgrade = self.options[self.selected_index]
-                player.add_upgrade(selected_upgrade)
                 self.hide()
-                return True
-        return False
+                return self.selected_index
+        return None
 
 
 class Enemy:
+    """One regular enemy; its movement state lives in the Simulation's EnemySwarm."""
+    __slots__ = ("x", "y", "prev_x", "prev_y", "enemy_type", "uid", "bullets", "sprite_name", "angle", "radius",
+                 "base_speed", "health", "color", "exp_value")
+    uids = itertools.count()
+
     def __init__(self, x, y, enemy_type, wave=1):
+        self.bullets = []
+        self.reset(x, y, enemy_type, wave)
+
+    def reset(self, x, y, enemy_type, wave=1):
         self.x = x
         self.y = y
+        self.prev_x = x
+        self.prev_y = y
         self.enemy_type = enemy_type
-        self.bullets = []
-        self.slowed = False
-        self.slow_timer = 0
-        self.sprites = {
-            "tank": pygame.image.load("Sprites/tank.png"),
-            "assassin": pygame.image.load("Sprites/assassin.png"),
-            "mage": pygame.image.load("Sprites/mage.png")
-        }
-
-        # Scale the tank and mage sprites
-        self.sprites["tank"] = pygame.transform.scale(self.sprites["tank"],
-                                                      (self.sprites["tank"].get_width() * 3,
-                                                       self.sprites["tank"].get_height() * 3))
-        self.sprites["mage"] = pygame.transform.scale(self.sprites["mage"],
-                                                      (self.sprites["mage"].get_width() * 2,
-                                                       self.sprites["mage"].get_height() * 2))
-
-        self.sprite = self.sprites[enemy_type]
+        self.uid = next(Enemy.uids)  # Stable identity for homing targets, never reused by a recycled enemy
+        self.sprite_name = enemy_type  # Looked up in ASSETS when drawing
         self.angle = 90
         wave_scale = 1 + (wave - 1) * 0.25
 
@@ -439,159 +1478,335 @@ class Enemy:
         if enemy_type == "tank":
             self.radius = 25
             self.base_speed = 2
-            self.speed = self.base_speed
             self.health = int(50 * wave_scale)
             self.color = ORANGE
             self.exp_value = 15
         elif enemy_type == "assassin":
             self.radius = 12
             self.base_speed = 4
-            self.speed = self.base_speed
             self.health = int(5 * wave_scale)
             self.color = RED
-            self.dash_distance = 200
-            self.dash_cooldown = 0
-            self.dash_delay = 60
-            self.is_dashing = False
             self.exp_value = 10
         else:  # mage
             self.radius = 15
             self.base_speed = 2
-            self.speed = self.base_speed
             self.health = int(20 * wave_scale)
             self.color = PURPLE
-            self.spell_cooldown = 0
-            self.spell_delay = 120
             self.exp_value = 20
 
-    def move_towards_player(self, player, enemies):
-        if self.slowed:
-            if self.slow_timer > 0:
-                self.slow_timer -= 1
-            else:
-                self.slowed = False
-                self.speed = self.base_speed
-
-        dx = player.x - self.x
-        dy = player.y - self.y
-        distance = math.sqrt(dx ** 2 + dy ** 2)
-
-        if distance != 0:
-            dx = dx / distance
-            dy = dy / distance
-
-            # Calculate angle for rotation
-            self.angle = math.degrees(math.atan2(-dy, dx))  # Invert dy for correct rotation
-
-            if self.enemy_type == "assassin":
-                if distance < self.dash_distance and self.dash_cooldown <= 0:
-                    self.is_dashing = True
-                    self.dash_cooldown = self.dash_delay
-                    self.speed = 15  # Dash speed
-                elif self.dash_cooldown <= 0:
-                    self.speed = self.base_speed
-
-                if self.dash_cooldown > 0:
-                    self.dash_cooldown -= 1
-
-            new_x = self.x + dx * self.speed
-            new_y = self.y + dy * self.speed
-
-            # Check collision with other enemies
-            can_move = True
-            for enemy in enemies:
-                if enemy != self:
-                    dist = math.sqrt((new_x - enemy.x) ** 2 + (new_y - enemy.y) ** 2)
-                    if dist < (self.radius + enemy.radius):
-                        can_move = False
-                        break
-
-            if can_move:
-                self.x = new_x
-                self.y = new_y
+    def advance(self, new_x, new_y, neighbors):
+        """Moves to the steered position unless it overlaps a neighbor; returns whether it moved."""
+        for enemy in neighbors.query(new_x, new_y):
+            if enemy is not self:
+                dist = math.sqrt((new_x - enemy.x) ** 2 + (new_y - enemy.y) ** 2)
+                if dist < (self.radius + enemy.radius):
+                    return False
+
+        neighbors.move(self, self.x, self.y, new_x, new_y)
+        self.x = new_x
+        self.y = new_y
+        return True
 
     def cast_spell(self, player):
-        if self.enemy_type == "mage" and self.spell_cooldown <= 0:
-            for _ in range(3):
-                bullet = Bullet(self.x, self.y, player.x, player.y,
-                                speed=4, color=YELLOW, homing=True)
-                self.bullets.append(bullet)
-            self.spell_cooldown = self.spell_delay
-
-    def update(self, player):
-        if self.enemy_type == "mage":
-            if self.spell_cooldown > 0:
-                self.spell_cooldown -= 1
+        """Fires a mage's homing volley; the swarm decides when a mage is ready."""
+        for _ in range(3):
+            bullet = BULLETS.acquire(self.x, self.y, player.x, player.y,
+                                     speed=4, color=YELLOW, homing=True)
+            self.bullets.append(bullet)
 
-            for bullet in self.bullets[:]:
-                bullet.move([player])  # Pass player as a list for homing
-                if bullet.is_off_screen():
-                    self.bullets.remove(bullet)
+    def update(self, player, width, height):
+        if self.enemy_type == "mage":
+            target = [player]  # Passed as a list for homing
+            for bullet in self.bullets:
+                bullet.move(target)
+            BULLETS.sweep(self.bullets, (bullet.is_off_screen(width, height) for bullet in self.bullets))
 
-    def draw(self, screen):
+    def draw(self, batch, alpha=1.0):
+        x, y = lerp(self.prev_x, self.x, alpha), lerp(self.prev_y, self.y, alpha)
         # Rotate the sprite
-        rotated_sprite = pygame.transform.rotate(self.sprite, self.angle)
-        sprite_rect = rotated_sprite.get_rect(center=(self.x, self.y))  # Center the sprite
+        rotated_sprite = ROTATIONS.rotate(ASSETS.sprite(self.sprite_name), self.angle)
+        sprite_rect = rotated_sprite.get_rect(center=(x, y))  # Center the sprite
 
         # Draw the rotated sprite
-        screen.blit(rotated_sprite, sprite_rect.topleft)
+        batch.add(batch.SPRITES, rotated_sprite, sprite_rect.topleft)
 
         # Draw enemy health bar
         health_width = 30
         max_health = 50 if self.enemy_type == "tank" else 20 if self.enemy_type == "mage" else 5
-        if self.enemy_type == "tank":
-            pygame.draw.rect(screen, RED, (self.x - health_width / 2, self.y - 50, health_width, 3))
-            pygame.draw.rect(screen, GREEN, (self.x - health_width / 2, self.y - 50,
-                                             health_width * (self.health / max_health), 3))
-        else:
-            pygame.draw.rect(screen, RED, (self.x - health_width / 2, self.y - 25, health_width, 3))
-            pygame.draw.rect(screen, GREEN, (self.x - health_width / 2, self.y - 25,
-                                             health_width * (self.health / max_health), 3))
+        bar_y = y - 50 if self.enemy_type == "tank" else y - 25
+        batch.rect(batch.BARS, RED, x - health_width / 2, bar_y, health_width, 3)
+        batch.rect(batch.BARS, GREEN, x - health_width / 2, bar_y, health_width, 3,
+                   fill=self.health / max_health)
 
         if self.enemy_type == "mage":
             for bullet in self.bullets:
-                bullet.draw(screen)
+                bullet.draw(batch, alpha)
 
-    def apply_slow(self, duration=60):  # 60 frames = 1 second at 60 FPS
-        self.slowed = True
-        self.speed = self.base_speed * 0.5  # 50% slow
-        self.slow_timer = duration
+    def remember_positions(self):
+        self.prev_x, self.prev_y = self.x, self.y
+        for bullet in self.bullets:
+            bullet.prev_x, bullet.prev_y = bullet.x, bullet.y
+
+
+ENEMIES = FreeList(Enemy)
+
+
+class EnemySwarm(ArrayStore):
+    """Structure-of-arrays movement state of Simulation.enemies, slot for slot."""
+    TANK, ASSASSIN, MAGE, BOSS = range(4)
+    KINDS = {"tank": TANK, "assassin": ASSASSIN, "mage": MAGE}
+
+    DASH_DISTANCE = 200  # An assassin this close to the player dashes at it
+    DASH_SPEED = 15
+    DASH_DELAY = 60
+    SPELL_DELAY = 120
+
+    FIELDS = ("x", "y", "next_x", "next_y", "speed", "base_speed", "slow_timer", "slowed", "dash_cooldown",
+              "spell_cooldown", "kind")
+
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.count = 0
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.next_x = np.zeros(capacity)  # Where steer() wants each enemy to go this frame
+        self.next_y = np.zeros(capacity)
+        self.speed = np.zeros(capacity)
+        self.base_speed = np.zeros(capacity)
+        self.slow_timer = np.zeros(capacity, dtype=np.int32)
+        self.slowed = np.zeros(capacity, dtype=bool)
+        self.dash_cooldown = np.zeros(capacity, dtype=np.int32)
+        self.spell_cooldown = np.zeros(capacity, dtype=np.int32)
+        self.kind = np.zeros(capacity, dtype=np.int8)
+
+    def add(self, enemy):
+        if self.count == self.capacity:
+            self._grow()
+        i = self.count
+        self.x[i] = self.next_x[i] = enemy.x
+        self.y[i] = self.next_y[i] = enemy.y
+        self.speed[i] = self.base_speed[i] = enemy.base_speed
+        self.slow_timer[i] = 0
+        self.slowed[i] = False
+        self.dash_cooldown[i] = 0
+        self.spell_cooldown[i] = 0
+        if isinstance(enemy, Boss):
+            self.kind[i] = self.BOSS
+            self.speed[i] = self.base_speed[i] = 0
+        else:
+            self.kind[i] = self.KINDS[enemy.enemy_type]
+        self.count += 1
+
+    def slow(self, i, duration=60):  # 60 frames = 1 second at 60 FPS
+        self.slowed[i] = True
+        self.speed[i] = self.base_speed[i] * 0.5  # 50% slow
+        self.slow_timer[i] = duration
+
+    def steer(self, target_x, target_y):
+        """Ticks slows and dashes and aims every enemy at the target; returns next positions and angles."""
+        n = self.count
+        kind = self.kind[:n]
+        x, y = self.x[:n], self.y[:n]
+        speed, base_speed = self.speed[:n], self.base_speed[:n]
+
+        # Slows wear off, restoring the base speed
+        slowed = self.slowed[:n]
+        if slowed.any():
+            slow_timer = self.slow_timer[:n]
+            ticking = slowed & (slow_timer > 0)
+            slow_timer -= ticking
+            recovered = slowed ^ ticking
+            slowed[recovered] = False
+            speed[recovered] = base_speed[recovered]
+
+        dx = target_x - x
+        dy = target_y - y
+        distance = np.sqrt(dx * dx + dy * dy)
+        moving = distance != 0
+        if not moving.all():
+            distance[~moving] = 1.0
+        dx /= distance
+        dy /= distance
+        angle = np.degrees(np.arctan2(-dy, dx))  # Invert dy for correct rotation
+
+        # Assassins dash once they get close, then fall back to their base speed after the cooldown
+        dash_cooldown = self.dash_cooldown[:n]
+        assassin = (kind == self.ASSASSIN) & moving
+        ready = assassin & (dash_cooldown <= 0)
+        dashing = ready & (distance < self.DASH_DISTANCE)
+        dash_cooldown[dashing] = self.DASH_DELAY
+        speed[dashing] = self.DASH_SPEED
+        walking = ready ^ dashing
+        speed[walking] = base_speed[walking]
+        dash_cooldown -= assassin & (dash_cooldown > 0)
+
+        # The boss's slot has no speed, so it stays put here
+        next_x = np.add(x, dx * speed, out=self.next_x[:n])
+        next_y = np.add(y, dy * speed, out=self.next_y[:n])
+        return next_x.tolist(), next_y.tolist(), angle.tolist(), moving.tolist()
+
+    def settle(self, blocked):
+        """Commits the positions from the last steer() except for the enemies whose indices are in `blocked`."""
+        if blocked:
+            self.next_x[blocked] = self.x[blocked]
+            self.next_y[blocked] = self.y[blocked]
+        self.x, self.next_x = self.next_x, self.x
+        self.y, self.next_y = self.next_y, self.y
+
+    def cast_ready(self):
+        """Ticks the mages' spell cooldowns; returns a list flagging the enemies that cast this frame."""
+        n = self.count
+        spell_cooldown = self.spell_cooldown[:n]
+        spell_cooldown -= spell_cooldown > 0
+        ready = (spell_cooldown <= 0) & (self.kind[:n] == self.MAGE)
+        spell_cooldown[ready] = self.SPELL_DELAY
+        return ready.tolist()
+
+
+class Emitter:
+    """One part of a boss attack: fires a precomputed volley into the boss's bullet pool."""
+
+    def __init__(self, speed, color, lifespan=-1, damage=5):
+        self.speed = speed
+        self.color = COLORS[color.upper()] if isinstance(color, str) else tuple(color)
+        self.lifespan = lifespan
+        self.damage = damage
+
+    def fire(self, boss, x, y, ux, uy):
+        boss.bullets.spawn_volley(x, y, ux, uy, self.speed, self.damage, self.lifespan, self.color)
+
+
+class RingEmitter(Emitter):
+    """`count` bullets evenly spaced around the boss, the ring turning `spin` degrees per frame."""
+
+    def __init__(self, count, start_angle=0, spin=0, **kwargs):
+        super().__init__(**kwargs)
+        angles = np.radians(start_angle + np.arange(count) * 360 / count)
+        self.ux = np.cos(angles)
+        self.uy = np.sin(angles)
+        self.spin = math.radians(spin)
+
+    def emit(self, boss, player):
+        ux, uy = self.ux, self.uy
+        if self.spin:
+            turn = self.spin * boss.attack_timer
+            cos, sin = math.cos(turn), math.sin(turn)
+            ux, uy = ux * cos - uy * sin, ux * sin + uy * cos
+        self.fire(boss, boss.x, boss.y, ux, uy)
+
+
+class SpreadEmitter(Emitter):
+    """A fan of bullets at fixed `angles` (degrees) either side of the line from the boss to the player."""
+
+    def __init__(self, angles, **kwargs):
+        super().__init__(**kwargs)
+        radians = np.radians(angles)
+        self.cos = np.cos(radians)
+        self.sin = np.sin(radians)
+
+    def emit(self, boss, player):
+        aim = math.atan2(player.y - boss.y, player.x - boss.x)
+        cos, sin = math.cos(aim), math.sin(aim)
+        self.fire(boss, boss.x, boss.y, cos * self.cos - sin * self.sin, sin * self.cos + cos * self.sin)
+
+
+class SineVolleyEmitter(Emitter):
+    """`count` bullets aimed at the player from a row around the boss, swaying along a sine wave."""
+
+    def __init__(self, count, spacing, amplitude, frames_per_radian, **kwargs):
+        super().__init__(**kwargs)
+        self.phases = (np.arange(count) - (count - 1) / 2) * spacing
+        self.amplitude = amplitude
+        self.frames_per_radian = frames_per_radian
+
+    def emit(self, boss, player):
+        x = boss.x + np.sin(boss.attack_timer / self.frames_per_radian + self.phases) * self.amplitude
+        dx = player.x - x
+        dy = np.full_like(x, player.y - boss.y)
+        distance = np.hypot(dx, dy)
+        distance[distance == 0] = 1
+        self.fire(boss, x, boss.y, dx / distance, dy / distance)
+
+
+EMITTERS = {"ring": RingEmitter, "spread": SpreadEmitter, "sine_volley": SineVolleyEmitter}
+
+BossPhase = namedtuple("BossPhase", "name health_below attack_delay emitters")
+BossPhase.__doc__ = """A boss phase, entered once health drops to `health_below` of the maximum. Every `attack_delay`
+frames each of its emitters fires."""
+
+
+def load_boss_patterns(path=BOSS_PATTERN_FILE):
+    """Reads the boss phases, in order, from a JSON pattern file; raises ValueError if malformed."""
+    with open(path) as file:
+        spec = json.load(file)
+    phases = []
+    try:
+        for phase in spec["phases"]:
+            emitters = []
+            for params in phase["emitters"]:
+                params = dict(params)
+                kind = params.pop("type")
+                if kind not in EMITTERS:
+                    raise ValueError(f"{path}: unknown emitter type {kind!r} (known: {', '.join(EMITTERS)})")
+                emitters.append(EMITTERS[kind](**params))
+            phases.append(BossPhase(phase["name"], phase["health_below"], phase["attack_delay"], emitters))
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"{path}: malformed boss pattern: {e!r}") from e
+    if not phases:
+        raise ValueError(f"{path}: no boss phases")
+    return phases
+
+
+_BOSS_PATTERNS = None
+
+
+def boss_patterns():
+    global _BOSS_PATTERNS
+    if _BOSS_PATTERNS is None:
+        _BOSS_PATTERNS = load_boss_patterns()
+    return _BOSS_PATTERNS
 
 
 # Add Boss class
 class Boss(Enemy):
-    def __init__(self, x, y):
+    __slots__ = ("width", "height", "rng", "speed", "slowed", "slow_timer", "max_health", "phase",
+                 "attack_cooldown", "attack_delay", "movement_timer", "attack_timer", "target_x", "target_y")
+
+    def __init__(self, x, y, width, height, rng):
         super().__init__(x, y, "tank")
+        self.width = width  # Arena size and random source for picking new positions
+        self.height = height
+        self.rng = rng
         self.radius = 40
         self.base_speed = 3
         self.speed = self.base_speed
+        self.slowed = False
+        self.slow_timer = 0
         self.health = 100000
         self.max_health = 100000
         self.color = RED
         self.exp_value = 500
-        self.state = BossState.PHASE1
+        self.phase = 0  # Index into boss_patterns()
         self.attack_cooldown = 0
-        self.attack_delay = 60
+        self.attack_delay = boss_patterns()[0].attack_delay
         self.movement_timer = 0
-        self.target_x = SCREEN_WIDTH // 2
-        self.target_y = SCREEN_HEIGHT // 4  # Boss stays in top quarter of screen
-        self.sprite = pygame.transform.scale(
-            pygame.image.load("Sprites/Boss.png"),  # You can replace with a boss sprite
-            (120, 120)
-        )
-        self.bullets = []
+        self.attack_timer = 0  # Frames since the boss appeared; drives the sine pattern
+        self.target_x = width // 2
+        self.target_y = height // 4  # Boss stays in top quarter of screen
+        self.sprite_name = "boss"
+        self.bullets = BulletPool(color=RED)
         self.angle = 90
 
-    def move_towards_player(self, player, enemies):
-        # Override the parent's movement method to ignore the player
+    def move_towards_player(self, player, neighbors):
+        # Unlike the swarm-steered enemies, the boss ignores the player
         self.movement_timer += 1
 
         # Change position every 3 seconds (180 frames)
         if self.movement_timer >= 180:
             self.movement_timer = 0
             # Pick a random position in the top quarter of the screen
-            self.target_x = random.randint(self.radius, SCREEN_WIDTH - self.radius)
-            self.target_y = random.randint(self.radius, SCREEN_HEIGHT // 4)
+            self.target_x = self.rng.randint(self.radius, self.width - self.radius)
+            self.target_y = self.rng.randint(self.radius, self.height // 4)
 
         # Move towards target position
         dx = self.target_x - self.x
@@ -601,127 +1816,297 @@ class Boss(Enemy):
         if distance > 5:  # Only move if we're not very close to target
             dx = dx / distance
             dy = dy / distance
-            self.x += dx * self.speed
-            self.y += dy * self.speed
+            new_x = self.x + dx * self.speed
+            new_y = self.y + dy * self.speed
+            neighbors.move(self, self.x, self.y, new_x, new_y)
+            self.x = new_x
+            self.y = new_y
 
         # Update angle for sprite rotation
         self.angle = math.degrees(math.atan2(-dy, dx))
 
     def special_attack(self, player):
         if self.attack_cooldown <= 0:
-            if self.state == BossState.PHASE1:
-                # Circle of bullets
-                time_factor = pygame.time.get_ticks() / 600
-                for i in range(-5, 6):
-                    x_offset = math.sin(time_factor + i * 0.5) * 100  # Sine wave offset
-                    bullet_x = self.x + x_offset  # Modify spawn position
-                    bullet_y = self.y  # Start from boss's Y position
-
-                    bullet = Bullet(bullet_x, bullet_y, player.x, player.y,
-                                    speed=6, color=PINK, lifespan=300)
-                    self.bullets.append(bullet)
-
-            elif self.state == BossState.PHASE2:
-                # Triple shot with spread
-                angles = [-15, 0, 15]
-                for angle in angles:
-                    rad_angle = math.radians(angle)
-                    dx = player.x - self.x
-                    dy = player.y - self.y
-                    rotated_dx = dx * math.cos(rad_angle) - dy * math.sin(rad_angle)
-                    rotated_dy = dx * math.sin(rad_angle) + dy * math.cos(rad_angle)
-                    target_x = self.x + rotated_dx
-                    target_y = self.y + rotated_dy
-                    bullet = Bullet(self.x, self.y, target_x, target_y,
-                                    speed=6, color=RED, homing=False, lifespan=1200)
-                    self.bullets.append(bullet)
-
-            elif self.state == BossState.PHASE3:
-                # Desperate attack - bullet hell
-                for angle in range(0, 360, 20):
-                    rad = math.radians(angle)
-                    target_x = self.x + math.cos(rad) * 100
-                    target_y = self.y + math.sin(rad) * 100
-                    bullet = Bullet(self.x, self.y, target_x, target_y,
-                                    speed=8, color=YELLOW, homing=False, lifespan=1200)
-                    self.bullets.append(bullet)
-
+            for emitter in boss_patterns()[self.phase].emitters:
+                emitter.emit(self, player)
             self.attack_cooldown = self.attack_delay
 
-    def update(self, player):
+    def update(self, player, width, height):
+        self.attack_timer += 1
+
         # Update attack cooldown
         if self.attack_cooldown > 0:
             self.attack_cooldown -= 1
 
-        # Update state based on health percentage
+        # Move on to the next phase once health drops far enough
         health_percent = self.health / self.max_health
-        if health_percent <= 0.3:
-            self.state = BossState.PHASE3
-            self.attack_delay = 45
-        elif health_percent <= 0.6:
-            self.state = BossState.PHASE2
-            self.attack_delay = 50
+        phases = boss_patterns()
+        while self.phase + 1 < len(phases) and health_percent <= phases[self.phase + 1].health_below:
+            self.phase += 1
+            self.attack_delay = phases[self.phase].attack_delay
 
         # Special attack
         self.special_attack(player)
 
         # Update bullets
-        for bullet in self.bullets[:]:
-            bullet.move([player])  # Pass player as a list for homing
-            if bullet.is_off_screen() or bullet.is_expired():
-                self.bullets.remove(bullet)
+        self.bullets.update(width, height)
 
-    def draw(self, screen):
+    def remember_positions(self):
+        self.prev_x, self.prev_y = self.x, self.y
+        self.bullets.remember_positions()
+
+    def apply_slow(self, duration=60):
+        self.slowed = True
+        self.speed = self.base_speed * 0.5  # 50% slow
+        self.slow_timer = duration
+
+    def draw(self, batch, alpha=1.0):
+        x, y = lerp(self.prev_x, self.x, alpha), lerp(self.prev_y, self.y, alpha)
         # Draw boss sprite
-        rotated_sprite = pygame.transform.rotate(self.sprite, self.angle)
-        sprite_rect = rotated_sprite.get_rect(center=(self.x, self.y))
-        screen.blit(rotated_sprite, sprite_rect.topleft)
+        rotated_sprite = ROTATIONS.rotate(ASSETS.sprite(self.sprite_name), self.angle)
+        sprite_rect = rotated_sprite.get_rect(center=(x, y))
+        batch.add(batch.SPRITES, rotated_sprite, sprite_rect.topleft)
 
         # Draw boss health bar at top of screen
         bar_width = SCREEN_WIDTH * 0.8
         bar_height = 20
         x = (SCREEN_WIDTH - bar_width) / 2
         y = 20
-        pygame.draw.rect(screen, RED, (x, y, bar_width, bar_height))
-        pygame.draw.rect(screen, GREEN, (x, y, bar_width * (self.health / self.max_health), bar_height))
+        batch.rect(batch.BARS, RED, x, y, bar_width, bar_height)
+        batch.rect(batch.BARS, GREEN, x, y, bar_width, bar_height, fill=self.health / self.max_health)
 
         # Draw bullets
-        for bullet in self.bullets:
-            bullet.draw(screen)
+        self.bullets.draw(batch, alpha)
+
+
+class OnlineLinearRegression:
+    """Least squares with an intercept, fitted from running normal-equation sums."""
+
+    def __init__(self, n_features, decay=1.0):
+        self.decay = decay
+        self.xtx = np.zeros((n_features + 1, n_features + 1))
+        self.xty = np.zeros(n_features + 1)
+        self.samples = 0
+        self.coef = None  # Solved lazily and cached until the next update
+
+    def warm_start(self, xtx, xty, samples):
+        """Seeds the sums with ones saved from earlier sessions."""
+        self.xtx = np.array(xtx, dtype=np.float64)
+        self.xty = np.array(xty, dtype=np.float64)
+        self.samples = samples
+        self.coef = None
+
+    def update(self, features, target):
+        x = np.array((*features, 1.0))
+        if self.decay != 1.0:
+            self.xtx *= self.decay
+            self.xty *= self.decay
+        self.xtx += np.outer(x, x)
+        self.xty += x * target
+        self.samples += 1
+        self.coef = None
+
+    def predict(self, features):
+        if self.coef is None:
+            self.coef = np.linalg.lstsq(self.xtx, self.xty, rcond=None)[0]
+        return float(np.dot(self.coef[:-1], features) + self.coef[-1])
+
+
+class TrainingStore:
+    """Finished runs' predictor samples, persisted across sessions."""
+    DTYPE = np.dtype([("session", np.uint32), ("features", np.float32, (6,)), ("score", np.float32)])
+
+    def __init__(self, path=TRAINING_STORE_FILE, model_path=TRAINING_MODEL_FILE, max_rows=TRAINING_STORE_MAX_ROWS):
+        self.path = path
+        self.model_path = model_path
+        self.max_rows = max_rows
+        self.rows = self.map_rows()
+
+    def map_rows(self):
+        try:
+            count = os.path.getsize(self.path) // self.DTYPE.itemsize
+        except OSError:
+            count = 0
+        if count == 0:
+            return np.zeros(0, dtype=self.DTYPE)
+        return np.memmap(self.path, dtype=self.DTYPE, mode="r", shape=(count,))
+
+    def prior(self):
+        """Returns (xtx, xty, samples) for warm-starting an OnlineLinearRegression, or None."""
+        if len(self.rows) == 0:
+            return None
+        try:
+            sums = np.load(self.model_path, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            print(f"Error loading score model: {e}")
+            return None
+        if sums.shape != (8, 7):
+            return None
+        return np.array(sums[:7]), np.array(sums[7]), len(self.rows)
+
+    @staticmethod
+    def sums(rows):
+        x = np.ones((len(rows), 7))
+        x[:, :6] = rows["features"]
+        return np.vstack([x.T @ x, x.T @ rows["score"].astype(np.float64)])
+
+    def downsample(self, rows):
+        """Halves sessions oldest first, over repeated passes, until the rows fit under max_rows."""
+        while len(rows) > self.max_rows:
+            for session in np.unique(rows["session"]):
+                members = np.flatnonzero(rows["session"] == session)
+                rows = np.delete(rows, members[1::2] if len(members) > 1 else members)
+                if len(rows) <= self.max_rows:
+                    break
+        return rows
+
+    def append_session(self, samples):
+        """Stores one finished run's (features, score) samples."""
+        if not samples:
+            return
+        new = np.zeros(len(samples), dtype=self.DTYPE)
+        new["session"] = int(self.rows["session"][-1]) + 1 if len(self.rows) else 0
+        new["features"] = [features for features, _ in samples]
+        new["score"] = [score for _, score in samples]
+
+        prior = self.prior()
+        old = np.array(self.rows)
+        self.rows = None  # Release the mapping before the file is rewritten
+        try:
+            if len(old) + len(new) > self.max_rows or (len(old) and prior is None):
+                rows = self.downsample(np.concatenate([old, new]))
+                with open(self.path + ".tmp", "wb") as file:
+                    file.write(rows.tobytes())
+                os.replace(self.path + ".tmp", self.path)
+                sums = self.sums(rows)
+            else:
+                with open(self.path, "ab") as file:
+                    file.write(new.tobytes())
+                sums = self.sums(new)
+                if prior is not None:
+                    sums[:7] += prior[0]
+                    sums[7] += prior[1]
+            with open(self.model_path + ".tmp", "wb") as file:
+                np.save(file, sums)
+            os.replace(self.model_path + ".tmp", self.model_path)
+        except OSError as e:
+            print(f"Error saving score history: {e}")
+        self.rows = self.map_rows()
+
+
+class Leaderboard:
+    """The best runs' scores with their wave, level, kills and length, persisted encrypted."""
+
+    def __init__(self, path=HIGH_SCORE_FILE, size=LEADERBOARD_SIZE):
+        self.path = path
+        self.size = size
+        self.entries = None  # Best first; None until loaded
+        self.lock = threading.Lock()
+        self.writer = None  # BackgroundTask of the most recent write
+
+    def load(self):
+        """Returns the entries, reading and decrypting the file on the first call only."""
+        with self.lock:
+            if self.entries is None:
+                self.entries = self.read()
+            return self.entries
+
+    def read(self):
+        try:
+            with open(self.path, "rb") as file:
+                encrypted_text = file.read().strip()
+            if not encrypted_text:
+                return []
+            text = get_cipher().decrypt(encrypted_text).decode()
+            if text.startswith("{"):
+                return json.loads(text)["entries"][:self.size]
+            # Legacy format: the best score with each digit stored as a letter from 'a'
+            digits = "".join(str(ord(char) - ord("a")) for char in text if "a" <= char <= "j")
+            return [{"score": int(digits)}] if digits else []
+        except FileNotFoundError:
+            return []
+        except Exception as e:
+            print(f"Error loading high scores: {e!r}")
+            return []
+
+    def best(self):
+        entries = self.load()
+        return entries[0]["score"] if entries else 0
+
+    def record(self, score, wave, level, kills, seconds):
+        """Adds a finished run; returns its 1-based rank, or None if it did not make the board."""
+        if score <= 0:
+            return None
+        entry = {"score": score, "wave": wave, "level": level, "kills": kills, "time": round(seconds, 1),
+                 "date": time.strftime("%Y-%m-%d %H:%M")}
+        entries = self.load()
+        rank = next((i for i, other in enumerate(entries) if score > other["score"]), len(entries))
+        if rank >= self.size:
+            return None
+        entries.insert(rank, entry)
+        del entries[self.size:]
+        self.writer = BackgroundTask(self.write, list(entries), self.writer)
+        return rank + 1
+
+    def write(self, entries, previous):
+        if previous is not None:
+            previous.thread.join()  # Keep writes in order, so the newest board lands last
+        try:
+            data = get_cipher().encrypt(json.dumps({"version": 2, "entries": entries}).encode())
+            with open(self.path + ".tmp", "wb") as file:
+                file.write(data)
+            os.replace(self.path + ".tmp", self.path)
+        except OSError as e:
+            print(f"Error saving high scores: {e}")
+
+    def flush(self):
+        """Waits for any pending write, e.g. before the process exits."""
+        if self.writer is not None:
+            self.writer.thread.join()
+
+    def format(self):
+        lines = [f"{'#':>2}  {'score':>8}  {'wave':>4}  {'level':>5}  {'kills':>5}  {'time':>7}  date"]
+        for rank, entry in enumerate(self.load(), 1):
+            if "wave" not in entry:  # Migrated from the old single-score file
+                lines.append(f"{rank:>2}  {entry['score']:>8}")
+                continue
+            lines.append(f"{rank:>2}  {entry['score']:>8}  {entry['wave']:>4}  {entry['level']:>5}  "
+                         f"{entry['kills']:>5}  {entry['time']:>6.1f}s  {entry['date']}")
+        return "\n".join(lines)
+
+
+LEADERBOARD = Leaderboard()
 
 
 class ScorePredictor:
-    def __init__(self):
-        self.model = LinearRegression()
-        self.data_X = []
-        self.data_y = []
-        self.font = pygame.font.SysFont("Arial", 16)
+    MIN_SAMPLES = 6
+
+    def __init__(self, decay=1.0, prior=None):
+        self.model = OnlineLinearRegression(6, decay)
+        if prior is not None:
+            self.model.warm_start(*prior)
         self.high_score = 0
+        self.predicted_final_score = None  # Computed once per data point, read by every draw
+        self.data_points = 0
+        self.session_samples = []  # Every TRAINING_SAMPLE_STRIDE-th sample, saved when the run ends
 
     def add_data_point(self, game_time, score, experience, total_kills, wave, level, high_score):
-        self.data_X.append([game_time, experience, total_kills, wave, level, high_score])
-        self.data_y.append([score])
+        features = (game_time, experience, total_kills, wave, level, high_score)
+        self.model.update(features, score)
         self.high_score = high_score
+        if self.data_points % TRAINING_SAMPLE_STRIDE == 0:
+            self.session_samples.append((features, score))
+        self.data_points += 1
 
-        if len(self.data_X) >= 6:
-            self.train_model()
-
-    def train_model(self):
-        # Train linear regression model
-        X = np.array(self.data_X, dtype=np.float32)
-        y = np.array(self.data_y, dtype=np.float32)
-        self.model.fit(X, y)
+        if self.model.samples >= self.MIN_SAMPLES:
+            predicted_score = self.model.predict(features)
+            wave_factor = np.log2(np.log2(wave+1)+1) # Smooth growth instead of linear
+            self.predicted_final_score = max(0, predicted_score * wave_factor)
 
     def draw(self, surface):
-        if len(self.data_X) < 6:
-            return  # Not enough data for prediction
-
-        current_data = np.array([self.data_X[-1]], dtype=np.float32)
-        predicted_score = self.model.predict(current_data)[0][0]
-
-        wave = self.data_X[-1][3]  # wave is the 4th input (index 3)
-        wave_factor = np.log2(np.log2(wave+1)+1) # Smooth growth instead of linear
-        predicted_final_score = max(0, predicted_score * wave_factor)
+        if self.predicted_final_score is None:
+            return []  # Not enough data for prediction
+        predicted_final_score = self.predicted_final_score
 
         # Cap based on high score
         cap = max(self.high_score, predicted_final_score, 1)
@@ -738,183 +2123,553 @@ class ScorePredictor:
         bar_y = screen_height - bar_height - padding
 
         # Yellow transparent background
-        bg_surface = pygame.Surface((bar_width + 10, bar_height + 40), pygame.SRCALPHA)
-        bg_surface.fill((255, 255, 0, 100))
-        surface.blit(bg_surface, (bar_x - 5, bar_y - 30))
+        rects = [surface.blit(predictor_backdrop((bar_width + 10, bar_height + 40)), (bar_x - 5, bar_y - 30))]
 
         # Draw bar background and progress
         pygame.draw.rect(surface, (60, 60, 60), (bar_x, bar_y, bar_width, bar_height))
         pygame.draw.rect(surface, (0, 255, 0), (bar_x, bar_y + bar_height - filled_height, bar_width, filled_height))
 
-        # White text
-        text = self.font.render(f"{int(predicted_final_score)}", True, (255, 255, 255))
-        text_rect = text.get_rect(center=(bar_x + bar_width // 2, bar_y - 10))
-        surface.blit(text, text_rect)
-
+        # White text (skipped until the background font lookup has finished)
+        font = predictor_font()
+        if font.done():
+            text = TEXTS.render(font.result(), f"{int(predicted_final_score)}", WHITE)
+            text_rect = text.get_rect(center=(bar_x + bar_width // 2, bar_y - 10))
+            rects.append(surface.blit(text, text_rect))
+        return rects
+
+
+FrameInput = namedtuple("FrameInput", "up down left right mouse_x mouse_y upgrade_choice",
+                        defaults=(False, False, False, False, 0, 0, -1))
+FrameInput.__doc__ = """One frame of player input. upgrade_choice indexes Simulation.upgrade_options (-1 for none)."""
+
+
+class InputRecording:
+    """The seed, arena size and per-step FrameInputs of one game, enough to replay it exactly."""
+    MAGIC = b"BHIR"
+    VERSION = 1
+    HEADER = struct.Struct("<4sBQHH")  # magic, version, seed, width, height
+    UP, DOWN, LEFT, RIGHT, MOUSE, CHOICE = 1, 2, 4, 8, 16, 32
+    REPEAT = 128
+    FLUSH_BYTES = 4096
+
+    def __init__(self, path, seed, width, height):
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(self.HEADER.pack(self.MAGIC, self.VERSION, seed, width, height))
+        self.buffer = bytearray()
+        self.keys = None  # Key bits and mouse position of the last input written
+        self.mouse = (0, 0)
+        self.repeats = 0
+
+    @staticmethod
+    def write_varint(buffer, value):
+        while value >= 0x80:
+            buffer.append(value & 0x7F | 0x80)
+            value >>= 7
+        buffer.append(value)
+
+    @staticmethod
+    def read_varint(data, position):
+        value = shift = 0
+        while True:
+            byte = data[position]
+            position += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value, position
+            shift += 7
+
+    def record(self, inputs):
+        keys = ((self.UP if inputs.up else 0) | (self.DOWN if inputs.down else 0) |
+                (self.LEFT if inputs.left else 0) | (self.RIGHT if inputs.right else 0))
+        mouse = (inputs.mouse_x, inputs.mouse_y)
+        if keys == self.keys and mouse == self.mouse and inputs.upgrade_choice < 0:
+            self.repeats += 1
+            return
 
-class Game:
-    def __init__(self):
-        self.screen = pygame.display.set_mode()
-        pygame.display.set_caption("Bullet Hell Game")
-        self.clock = pygame.time.Clock()
-        self.font = pygame.font.Font(None, 36)
-        self.player = Player(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+        self.end_repeats()
+        buffer = self.buffer
+        flags = keys | (self.MOUSE if mouse != self.mouse else 0) | (self.CHOICE if inputs.upgrade_choice >= 0 else 0)
+        buffer.append(flags)
+        if flags & self.MOUSE:
+            for delta in (mouse[0] - self.mouse[0], mouse[1] - self.mouse[1]):
+                self.write_varint(buffer, delta << 1 if delta >= 0 else (-delta << 1) - 1)  # Zigzag
+        if flags & self.CHOICE:
+            buffer.append(inputs.upgrade_choice)
+        self.keys, self.mouse = keys, mouse
+        if len(buffer) >= self.FLUSH_BYTES:
+            self.file.write(buffer)
+            buffer.clear()
+
+    def end_repeats(self):
+        if self.repeats:
+            self.buffer.append(self.REPEAT)
+            self.write_varint(self.buffer, self.repeats)
+            self.repeats = 0
+
+    def close(self):
+        self.end_repeats()
+        self.file.write(self.buffer)
+        self.file.close()
+
+    @classmethod
+    def load(cls, path):
+        """Returns (seed, width, height, inputs) from a recording, inputs being a list of FrameInputs."""
+        with open(path, "rb") as file:
+            data = file.read()
+        magic, version, seed, width, height = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError(f"{path} is not a version {cls.VERSION} input recording")
+
+        inputs = []
+        previous = FrameInput()
+        mouse_x = mouse_y = 0
+        position = cls.HEADER.size
+        while position < len(data):
+            flags = data[position]
+            position += 1
+            if flags == cls.REPEAT:
+                count, position = cls.read_varint(data, position)
+                inputs.extend([previous] * count)
+                continue
+            if flags & cls.MOUSE:
+                deltas = []
+                for _ in range(2):
+                    zigzag, position = cls.read_varint(data, position)
+                    deltas.append(zigzag >> 1 if not zigzag & 1 else -((zigzag + 1) >> 1))
+                mouse_x += deltas[0]
+                mouse_y += deltas[1]
+            choice = -1
+            if flags & cls.CHOICE:
+                choice = data[position]
+                position += 1
+            inputs.append(FrameInput(bool(flags & cls.UP), bool(flags & cls.DOWN), bool(flags & cls.LEFT),
+                                     bool(flags & cls.RIGHT), mouse_x, mouse_y, choice))
+            previous = inputs[-1]._replace(upgrade_choice=-1)  # A pick is never repeated
+        return seed, width, height, inputs
+
+
+def replay_headless(path):
+    """Replays a recording without a display as fast as the simulation runs and reports where time went."""
+    seed, width, height, inputs = InputRecording.load(path)
+    sim = Simulation(width, height, seed=seed)
+    timer = StageTimer()
+    start = time.perf_counter()
+    for frame_input in inputs:
+        timer.start()
+        sim.step(frame_input, timer)
+    elapsed = time.perf_counter() - start
+    print(f"Replayed {len(inputs)} steps in {elapsed:.2f} s ({len(inputs) / elapsed:,.0f} steps/s): wave {sim.wave}, "
+          f"score {sim.player.score}, {'victory' if sim.victory else 'game over' if sim.game_over else 'unfinished'}")
+    print("  ".join(f"{stage} {total * 1000 / max(1, len(inputs)):.3f} ms" for stage, total in timer.totals.items()))
+    return sim
+
+
+def snapshot_fields(obj, names):
+    """The attributes `names` of `obj` as JSON-ready values, for a snapshot header."""
+    return {name: getattr(obj, name) for name in names}
+
+
+def snapshot_value(current, value):
+    """Checks a snapshot `value` against the `current` one it replaces; lists (colors) come back as tuples."""
+    if isinstance(current, bool):
+        valid = isinstance(value, bool)
+    elif current is None or isinstance(current, (int, float)):
+        valid = value is None or (isinstance(value, (int, float)) and not isinstance(value, bool))
+    elif isinstance(current, str):
+        valid = isinstance(value, str)
+    elif isinstance(current, tuple):
+        valid = isinstance(value, list) and all(isinstance(item, (int, float)) for item in value)
+        value = tuple(value) if valid else value
+    else:
+        valid = False
+    if not valid:
+        raise ValueError(f"{value!r} cannot replace {current!r}")
+    return value
+
+
+def restore_fields(obj, fields, names):
+    """Sets the fields saved by snapshot_fields() on a freshly built `obj`; only `names` are allowed."""
+    for name, value in fields.items():
+        if name not in names:
+            raise ValueError(f"unexpected snapshot field {name!r}")
+        setattr(obj, name, snapshot_value(getattr(obj, name), value))
+
+
+def restore_pool(pool, meta, arrays, prefix):
+    pool.radius = snapshot_value(pool.radius, meta["radius"])
+    pool.palette = [snapshot_value(pool.palette[0], color) for color in meta["palette"]]
+    pool.load_arrays(arrays, prefix)
+
+
+class Simulation:
+    """The game rules, advanced one frame at a time by step(); deterministic for a seed and inputs."""
+
+    def __init__(self, width, height, seed=None, high_score=0, prior=None):
+        self.width = width
+        self.height = height
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.rng = random.Random(self.seed)
+        self.player = Player(width // 2, height // 2)
         self.enemies = []
+        self.swarm = EnemySwarm()  # Movement state of self.enemies, slot for slot
         self.enemy_spawn_timer = 0
         self.enemy_spawn_delay = 60
-        self.upgrade_menu = UpgradeMenu(self.screen)
+        self.upgrades = create_upgrades()
+        self.upgrade_options = []  # Non-empty while the game waits for the player to pick an upgrade
         self.game_over = False
         self.wave = 1
         self.wave_timer = 0
         self.wave_duration = 1800  # 30 seconds at 60 FPS
-        self.background = pygame.image.load(
-            "BackGround/Background.png").convert()
-        self.background = pygame.transform.scale(self.background, self.screen.get_size())
         self.boss = None
         self.victory = False
-
-        self.background_music = None
-        self.boss_music = None
-        self.victory_music = None
-        self.game_over_music = None
-        self.music_volume = 0.5
-        self.load_music()
-        self.high_score = self.load_high_score()
-        self.score_predictor = ScorePredictor()
+        self.high_score = high_score
+        self.score_predictor = ScorePredictor(prior=prior)
         self.game_time = 0  # Track game time in frames
         self.total_kills = 0
+        self.enemy_grid = SpatialHash()
+        self.collision_grid = SpatialHash()
+        self.hostile_grid = SpatialHash()
+        boss_patterns()  # Read and checked now, so a broken pattern file fails at launch rather than at wave 5
+
+    def step(self, inputs, timer=NULL_TIMER):
+        """Advances the game by one frame of `inputs` (a FrameInput), lapping `timer` after each stage."""
+        self.remember_positions()
+        if self.upgrade_options:
+            if not 0 <= inputs.upgrade_choice < len(self.upgrade_options):
+                return  # Paused until an upgrade is picked
+            self.player.add_upgrade(self.upgrade_options[inputs.upgrade_choice])
+            self.upgrade_options = []
+
+        if self.game_over or self.victory:
+            return
 
-    def encryption(self):
-        # Convert score to string directly, then encrypt it
-        score_str = str(self.high_score)
-        # Simple encoding: adding 'a' to each digit to get a character
-        encoded = ''.join([chr(int(digit) + ord('a')) for digit in score_str])
-        encrypted = CIPHER.encrypt(encoded.encode())
-        return encrypted
+        self.player.move(inputs, self.width, self.height)
+        self.game_time += 1
+        previous_enemy_count = len(self.enemies)
 
-    def load_high_score(self):
-        try:
-            with open("highscore.txt", "rb") as file:
-                encrypted_text = file.read().strip()
-                if not encrypted_text:
-                    return 0
-                decrypted_text = CIPHER.decrypt(encrypted_text).decode()
-                # Decode by subtracting 'a' from each character to get a digit
-                score_str = ''
-                for char in decrypted_text:
-                    # Make sure we only process valid characters
-                    if ord(char) >= ord('a') and ord(char) <= ord('a') + 9:
-                        score_str += str(ord(char) - ord('a'))
-                print(f"Decoded score string: {score_str}")  # Debug print
-                return int(score_str) if score_str else 0
-        except (FileNotFoundError, ValueError, Exception) as e:
-            print(f"Error loading high score: {e}")
-            return 0
-
-    def save_high_score(self):
-        # Only save if current score is higher than high score
-        print(f"Current score: {self.player.score}, High score: {self.high_score}")  # Debug print
-        if self.player.score > self.high_score:
-            self.high_score = self.player.score
-            with open("highscore.txt", "wb") as file:
-                encrypted = self.encryption()
-                file.write(encrypted)
-            print(f"New high score saved: {self.high_score}")
-
-    def load_music(self):
+        # Auto-shoot at mouse position
+        self.player.auto_shoot(inputs.mouse_x, inputs.mouse_y)
+        self.player.update(self.enemies, inputs.mouse_x, inputs.mouse_y, self.width, self.height)
+        timer.lap("player")
+
+        # Enemy spawning
+        self.enemy_spawn_timer += 1
+        if self.enemy_spawn_timer >= self.enemy_spawn_delay:
+            self.spawn_enemy()
+            self.enemy_spawn_timer = 0
+
+        # Update wave
+        self.update_wave()
+
+        # Update enemies
+        self.enemy_grid.clear()
+        for enemy in self.enemies:
+            self.enemy_grid.insert(enemy, enemy.x, enemy.y)
+        player = self.player
+        next_x, next_y, angles, moving = self.swarm.steer(player.x, player.y)
+        casting = self.swarm.cast_ready()
+        blocked = []
+        for index, enemy in enumerate(self.enemies):
+            # In list order, so each separation check sees the enemies before it already moved
+            if isinstance(enemy, Boss):
+                enemy.move_towards_player(player, self.enemy_grid)
+            elif moving[index]:
+                enemy.angle = angles[index]
+                if not enemy.advance(next_x[index], next_y[index], self.enemy_grid):
+                    blocked.append(index)
+            enemy.update(player, self.width, self.height)
+            if casting[index]:
+                enemy.cast_spell(player)
+        self.swarm.settle(blocked)
+        timer.lap("enemies")
+
+        self.check_collisions()
+        timer.lap("collisions")
+
+        # Count kills this frame
+        current_enemy_count = len(self.enemies)
+        new_kills = previous_enemy_count - current_enemy_count
+        if new_kills > 0:
+            self.total_kills += new_kills
+
+        # Add data point to predictor
+        self.score_predictor.add_data_point(
+            self.game_time,
+            self.player.score,
+            self.player.experience,
+            self.total_kills,
+            self.wave,
+            self.player.level,
+            self.high_score
+        )
+
+        self.check_level_up()
+
+        if self.player.health <= 0:
+            self.game_over = True
+
+        self.check_victory()
+        timer.lap("predictor")
+
+    # Attributes a snapshot keeps, per object; the player's are all its own but its bullets and upgrades
+    SNAPSHOT_FIELDS = ("enemy_spawn_timer", "enemy_spawn_delay", "game_over", "wave", "wave_timer", "wave_duration",
+                       "victory", "game_time", "total_kills")
+    PREDICTOR_FIELDS = ("high_score", "predicted_final_score", "data_points")
+    ENEMY_FIELDS = tuple(name for name in Enemy.__slots__ if name != "bullets")
+    BOSS_FIELDS = ENEMY_FIELDS + tuple(name for name in Boss.__slots__ if name != "rng")
+
+    @staticmethod
+    def player_fields(player):
+        return [name for name in vars(player) if name not in ("bullets", "upgrades")]
+
+    def save(self, path):
+        """Writes the game state to `path` as a JSON header and arrays in a compressed .npz."""
+        player, predictor = self.player, self.score_predictor
+        arrays = {"predictor.xtx": predictor.model.xtx, "predictor.xty": predictor.model.xty}
+        arrays.update(player.bullets.to_arrays("player.bullets."))
+        arrays.update(self.swarm.to_arrays("swarm."))
+        header = {
+            "width": self.width,
+            "height": self.height,
+            "seed": self.seed,
+            "high_score": self.high_score,
+            "fields": snapshot_fields(self, self.SNAPSHOT_FIELDS),
+            "rng": self.rng.getstate(),
+            "upgrade_options": [upgrade.name for upgrade in self.upgrade_options],
+            "player": {
+                "fields": snapshot_fields(player, self.player_fields(player)),
+                "upgrades": [upgrade.name for upgrade in player.upgrades],
+                "bullets": {"radius": player.bullets.radius, "palette": player.bullets.palette},
+            },
+            "predictor": {
+                "fields": snapshot_fields(predictor, self.PREDICTOR_FIELDS),
+                "samples": predictor.model.samples,
+                "session_samples": predictor.session_samples,
+            },
+            # The boss is saved on its own, since it is kept after it dies; its place in the list is marked
+            "enemies": [{"boss": True} if enemy is self.boss else {
+                "fields": snapshot_fields(enemy, self.ENEMY_FIELDS),
+                "bullets": [snapshot_fields(bullet, Bullet.__slots__) for bullet in enemy.bullets],
+            } for enemy in self.enemies],
+            "boss": None,
+        }
+        if self.boss is not None:
+            boss = self.boss
+            header["boss"] = {
+                "fields": snapshot_fields(boss, self.BOSS_FIELDS),
+                "bullets": {"radius": boss.bullets.radius, "palette": boss.bullets.palette},
+            }
+            arrays.update(boss.bullets.to_arrays("boss.bullets."))
+        arrays["header"] = np.frombuffer(json.dumps(header).encode(), dtype=np.uint8)
+
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **arrays)
+        with open(path, "wb") as file:
+            file.write(SNAPSHOT_MAGIC + buffer.getvalue())
+
+    @staticmethod
+    def load(path):
+        """Reads a Simulation written by save(); raises ValueError for anything but a valid snapshot."""
+        with open(path, "rb") as file:
+            data = file.read()
+        if not data.startswith(SNAPSHOT_MAGIC):
+            raise ValueError(f"{path} is not a snapshot")
         try:
-            # Load different music tracks
-            pygame.mixer.music.load("Music/background_music.mp3")  # Main background music
-            self.boss_music = pygame.mixer.Sound("Music/boss_music.mp3")
-            self.victory_music = pygame.mixer.Sound("Music/victory_music.mp3")
-            self.game_over_music = pygame.mixer.Sound("Music/game_over_music.mp3")
-
-            # Set volumes
-            pygame.mixer.music.set_volume(self.music_volume)
-            self.boss_music.set_volume(self.music_volume)
-            self.victory_music.set_volume(self.music_volume)
-            self.game_over_music.set_volume(self.music_volume)
-
-            # Start playing background music and loop it
-            pygame.mixer.music.play(-1)  # -1 means loop indefinitely
-        except Exception as e:
-            print(f"Error loading music: {e}")
+            with np.load(io.BytesIO(data[len(SNAPSHOT_MAGIC):]), allow_pickle=False) as archive:
+                arrays = dict(archive)
+            header = json.loads(arrays.pop("header").tobytes())
+            sim = Simulation.from_snapshot(header, arrays)
+        except (KeyError, IndexError, TypeError, ValueError, AttributeError, zipfile.BadZipFile) as e:
+            raise ValueError(f"{path} is not a valid snapshot: {e!r}") from e
+        # New enemies must not reuse the uids of the restored ones, or homing bullets could switch targets
+        Enemy.uids = itertools.count(max([enemy.uid + 1 for enemy in sim.enemies] + [next(Enemy.uids)]))
+        return sim
+
+    @staticmethod
+    def from_snapshot(header, arrays):
+        sim = Simulation(*(snapshot_value(0, header[name]) for name in ("width", "height", "seed", "high_score")))
+        restore_fields(sim, header["fields"], Simulation.SNAPSHOT_FIELDS)
+        version, internal, gauss = header["rng"]
+        sim.rng.setstate((version, tuple(internal), gauss))
+        upgrades = {upgrade.name: upgrade for upgrade in sim.upgrades}
+        sim.upgrade_options = [upgrades[name] for name in header["upgrade_options"]]
+
+        player = sim.player
+        restore_fields(player, header["player"]["fields"], Simulation.player_fields(player))
+        player.upgrades = [upgrades[name] for name in header["player"]["upgrades"]]
+        restore_pool(player.bullets, header["player"]["bullets"], arrays, "player.bullets.")
+
+        predictor = sim.score_predictor
+        restore_fields(predictor, header["predictor"]["fields"], Simulation.PREDICTOR_FIELDS)
+        predictor.model.warm_start(arrays["predictor.xtx"], arrays["predictor.xty"],
+                                   snapshot_value(0, header["predictor"]["samples"]))
+        predictor.session_samples = [(snapshot_value((), features), snapshot_value(0, score))
+                                     for features, score in header["predictor"]["session_samples"]]
+
+        if header["boss"] is not None:
+            sim.boss = Boss(0, 0, sim.width, sim.height, sim.rng)
+            restore_fields(sim.boss, header["boss"]["fields"], Simulation.BOSS_FIELDS)
+            restore_pool(sim.boss.bullets, header["boss"]["bullets"], arrays, "boss.bullets.")
+        for entry in header["enemies"]:
+            if entry.get("boss"):
+                if sim.boss is None:
+                    raise ValueError("boss listed among the enemies but not saved")
+                sim.enemies.append(sim.boss)
+                continue
+            enemy_type = entry["fields"]["enemy_type"]
+            if enemy_type not in EnemySwarm.KINDS:
+                raise ValueError(f"unknown enemy type {enemy_type!r}")
+            enemy = Enemy(0, 0, enemy_type)
+            restore_fields(enemy, entry["fields"], Simulation.ENEMY_FIELDS)
+            for fields in entry["bullets"]:
+                bullet = Bullet(0, 0, 0, 0)
+                restore_fields(bullet, fields, Bullet.__slots__)
+                enemy.bullets.append(bullet)
+            sim.enemies.append(enemy)
+        sim.swarm.load_arrays(arrays, "swarm.")
+        if len(sim.swarm) != len(sim.enemies):
+            raise IndexError(f"{len(sim.swarm)} swarm slots for {len(sim.enemies)} enemies")
+        return sim
+
+    def remember_positions(self):
+        """Records where everything is before the step moves it, so drawing can interpolate between steps."""
+        player = self.player
+        player.prev_x, player.prev_y = player.x, player.y
+        player.bullets.remember_positions()
+        for enemy in self.enemies:
+            enemy.remember_positions()
 
     def spawn_enemy(self):
-        enemy_type = random.choice(["tank", "assassin", "mage"])
-        side = random.randint(0, 3)
+        enemy_type = self.rng.choice(["tank", "assassin", "mage"])
+        side = self.rng.randint(0, 3)
 
         if side == 0:  # Top
-            x = random.randint(0, SCREEN_WIDTH)
+            x = self.rng.randint(0, self.width)
             y = -50
         elif side == 1:  # Right
-            x = SCREEN_WIDTH + 50
-            y = random.randint(0, SCREEN_HEIGHT)
+            x = self.width + 50
+            y = self.rng.randint(0, self.height)
         elif side == 2:  # Bottom
-            x = random.randint(0, SCREEN_WIDTH)
-            y = SCREEN_HEIGHT + 50
+            x = self.rng.randint(0, self.width)
+            y = self.height + 50
         else:  # Left
             x = -50
-            y = random.randint(0, SCREEN_HEIGHT)
+            y = self.rng.randint(0, self.height)
+
+        self.add_enemy(ENEMIES.acquire(x, y, enemy_type, self.wave))
 
-        self.enemies.append(Enemy(x, y, enemy_type, self.wave))
+    def add_enemy(self, enemy):
+        self.enemies.append(enemy)
+        self.swarm.add(enemy)
 
     def check_collisions(self):
+        # Broadphase: bucket enemies by grid cell once, then every test only looks at nearby cells.
+        # Deaths are flagged during the tests and resolved in one batch at the end.
+        player = self.player
+        grid = self.collision_grid
+        grid.clear()
+        for index, enemy in enumerate(self.enemies):
+            grid.insert(index, enemy.x, enemy.y)
+        enemy_dead = [False] * len(self.enemies)
+
         # Check regular enemy-player collisions
-        for enemy in self.enemies[:]:
+        for index in sorted(grid.query(player.x, player.y)):
+            enemy = self.enemies[index]
             if not isinstance(enemy, Boss):  # Skip boss in collision check
-                distance = math.sqrt((enemy.x - self.player.x) ** 2 + (enemy.y - self.player.y) ** 2)
-                if distance < (enemy.radius + self.player.radius):
-                    if self.player.shield_active:
-                        self.player.shield_active = False
-                        self.player.shield_cooldown = 600  # 10 seconds at 60 FPS
-                        self.enemies.remove(enemy)
+                distance = math.sqrt((enemy.x - player.x) ** 2 + (enemy.y - player.y) ** 2)
+                if distance < (enemy.radius + player.radius):
+                    enemy_dead[index] = True
+                    if player.shield_active:
+                        player.shield_active = False
+                        player.shield_cooldown = 600  # 10 seconds at 60 FPS
                     else:
-                        self.enemies.remove(enemy)
-                        self.player.health -= 10
+                        player.health -= 10
 
         # Check player bullet-enemy collisions (including boss)
-        for bullet in self.player.bullets[:]:
-            for enemy in self.enemies[:]:
-                distance = math.sqrt((enemy.x - bullet.x) ** 2 + (enemy.y - bullet.y) ** 2)
-                if distance < (enemy.radius + bullet.radius):
-                    if bullet.temporal_decay:
-                        enemy.apply_slow()
-
-                    enemy.health -= bullet.damage
-                    if enemy.health <= 0:
-                        if isinstance(enemy, Boss):
-                            self.victory = True
-                        self.player.experience += enemy.exp_value
-                        self.player.score += enemy.exp_value * 10
-                        self.enemies.remove(enemy)
-
-                    if not bullet.piercing or bullet.enemies_hit >= bullet.max_pierce:
-                        if bullet in self.player.bullets:
-                            self.player.bullets.remove(bullet)
-                    else:
-                        bullet.enemies_hit += 1
-                    break
-
-        # Check mage bullet-player collisions
-        for enemy in self.enemies:
-            if enemy.enemy_type == "mage" or isinstance(enemy, Boss):
-                for bullet in enemy.bullets[:]:
-                    distance = math.sqrt((self.player.x - bullet.x) ** 2 + (self.player.y - bullet.y) ** 2)
-                    if distance < (self.player.radius + bullet.radius):
-                        if self.player.shield_active:
-                            self.player.shield_active = False
-                            self.player.shield_cooldown = 600
+        bullets = self.player.bullets
+        n = bullets.count
+        if n and self.enemies:
+            bullet_alive = np.ones(n, dtype=bool)
+            candidates = np.flatnonzero(grid.near_items(bullets.x[:n], bullets.y[:n]))
+            bullet_x = bullets.x[candidates].tolist()
+            bullet_y = bullets.y[candidates].tolist()
+            bullet_damage = bullets.damage[candidates].tolist()
+            bullet_flags = bullets.flags[candidates].tolist()
+            for k, i in enumerate(candidates.tolist()):
+                # Lowest index first, so a bullet hits the same enemy the full scan would have
+                for index in sorted(grid.query(bullet_x[k], bullet_y[k])):
+                    if enemy_dead[index]:
+                        continue
+                    enemy = self.enemies[index]
+                    distance = math.sqrt((enemy.x - bullet_x[k]) ** 2 + (enemy.y - bullet_y[k]) ** 2)
+                    if distance < (enemy.radius + bullets.radius):
+                        if bullet_flags[k] & BulletPool.TEMPORAL_DECAY:
+                            if isinstance(enemy, Boss):
+                                enemy.apply_slow()
+                            else:
+                                self.swarm.slow(index)
+
+                        enemy.health -= bullet_damage[k]
+                        if enemy.health <= 0:
+                            if isinstance(enemy, Boss):
+                                self.victory = True
+                            player.experience += enemy.exp_value
+                            player.score += enemy.exp_value * 10
+                            enemy_dead[index] = True
+
+                        if not bullet_flags[k] & BulletPool.PIERCING or bullets.enemies_hit[i] >= bullets.max_pierce[i]:
+                            bullet_alive[i] = False
                         else:
-                            self.player.health -= 5
-                        enemy.bullets.remove(bullet)
+                            bullets.enemies_hit[i] += 1
+                        break
+            bullets.compact(bullet_alive)
+
+        # Check mage and boss bullet-player collisions. The boss's pool is tested against the player in one pass.
+        hostile = self.hostile_grid
+        hostile.clear()
+        for index, enemy in enumerate(self.enemies):
+            if enemy_dead[index]:
+                continue
+            if enemy.enemy_type == "mage":
+                for bullet in enemy.bullets:
+                    hostile.insert((enemy, bullet), bullet.x, bullet.y)
+            elif isinstance(enemy, Boss) and len(enemy.bullets):
+                hit = enemy.bullets.touching(player.x, player.y, player.radius)
+                for damage in enemy.bullets.damage[:len(enemy.bullets)][hit].tolist():
+                    if player.shield_active:
+                        player.shield_active = False
+                        player.shield_cooldown = 600
+                    else:
+                        player.health -= damage
+                enemy.bullets.compact(~hit)
+        hits = {}  # enemy -> ids of its bullets that hit
+        for enemy, bullet in hostile.query(player.x, player.y):
+            distance = math.sqrt((player.x - bullet.x) ** 2 + (player.y - bullet.y) ** 2)
+            if distance < (player.radius + bullet.radius):
+                if player.shield_active:
+                    player.shield_active = False
+                    player.shield_cooldown = 600
+                else:
+                    player.health -= 5
+                hits.setdefault(enemy, set()).add(id(bullet))
+        for enemy, hit_ids in hits.items():
+            BULLETS.sweep(enemy.bullets, (id(bullet) in hit_ids for bullet in enemy.bullets))
+
+        if any(enemy_dead):
+            # A mage's bullets vanish with it
+            for enemy, dead in zip(self.enemies, enemy_dead):
+                if dead and not isinstance(enemy, Boss):
+                    BULLETS.release_all(enemy.bullets)
+            ENEMIES.sweep(self.enemies, enemy_dead)
+            self.swarm.compact(~np.array(enemy_dead))
 
     def check_level_up(self):
         if self.player.experience >= self.player.exp_to_level:
             self.player.experience -= self.player.exp_to_level
             self.player.level += 1
             self.player.exp_to_level = int(self.player.exp_to_level * 1.2)
-            self.upgrade_menu.show()
+            self.upgrade_options = self.rng.sample(self.upgrades, min(3, len(self.upgrades)))
 
     def update_wave(self):
         self.wave_timer += 1
@@ -924,28 +2679,106 @@ class Game:
             self.enemy_spawn_delay = max(20, int(self.enemy_spawn_delay * 0.9))  # Increase spawn rate
             self.player.health = min(self.player.max_health, self.player.health + 20)  # Heal between waves
             if self.wave == 5:
-                pygame.mixer.music.stop()
-                self.boss_music.play(-1)
-                self.boss = Boss(SCREEN_WIDTH // 2, -100)
-                self.enemies.append(self.boss)
+                self.boss = Boss(self.width // 2, -100, self.width, self.height, self.rng)
+                self.add_enemy(self.boss)
 
     def check_victory(self):
         if self.wave >= 10 and self.boss and self.boss.health <= 0:
             self.victory = True
-            if self.player.score > self.high_score:
-                self.high_score = self.player.score
-                self.save_high_score()
+
+
+class Game:
+    def __init__(self, startup=None, seed=None, dirty_rects=False):
+        # `startup` is a StartupTimer for the first launch; restarts re-run __init__ without one
+        self.screen = init_display()
+        pygame.display.set_caption("Bullet Hell Game")
+        self.clock = pygame.time.Clock()
+        self.font = pygame.font.Font(None, 36)
+        if startup:
+            startup.mark("display")
+
+        # Sprites and the background come out of the asset bundle on a loader thread, and decrypting the
+        # leaderboard (and importing cryptography) overlaps with that. Restarts find both cached
+        self.load_fraction = 0.0
+        assets_task = BackgroundTask(ASSETS.preload, self.screen.get_size(), self.loading_progress)
+        high_score_task = BackgroundTask(LEADERBOARD.best)
+
+        self.upgrade_menu = UpgradeMenu(self.screen)
+        self.upgrade_choice = -1  # Picked in the menu, handed to the simulation with the next frame's input
+        AUDIO.update("gameplay")  # On a restart this fades back from the game over track
+        if startup:
+            startup.mark("music")
+
+        self.background = self.wait_for_assets(assets_task)
+        if startup:
+            startup.mark("assets")
+
+        self.high_score = high_score_task.result()
+        if startup:
+            startup.mark("high score")
+
+        self.training_store = TrainingStore()
+        self.sim = Simulation(SCREEN_WIDTH, SCREEN_HEIGHT, seed=seed, high_score=self.high_score,
+                              prior=self.training_store.prior())
+        self.run_recorded = False
+        self.score_recorded = False
+        self.replaying = False  # Replays must not touch the high score or training data
+        if startup:
+            startup.mark("predictor")
+
+        self.profiler = None  # FrameProfiler, created when profiling is first switched on
+        self.show_profiler = False
+
+        self.batch = RenderBatcher()
+        self.dirty_rects = dirty_rects
+        self.previous_rects = None  # What the last frame drew, while it can be patched instead of redrawn
+        self.update_rects = None  # Display areas present() has to update; None for a full flip
+
+    def loading_progress(self, done, total):
+        self.load_fraction = done / total  # Called on the loader thread
+
+    def wait_for_assets(self, task):
+        """Shows a progress bar until the asset loader finishes; returns the background it loaded."""
+        while not task.done():
+            bar = pygame.Rect(0, 0, SCREEN_WIDTH // 3, 24)
+            bar.center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+            self.screen.fill(BLACK)
+            pygame.draw.rect(self.screen, WHITE, bar, 2)
+            filled = bar.inflate(-8, -8)
+            filled.width = int(filled.width * self.load_fraction)
+            pygame.draw.rect(self.screen, GREEN, filled)
+            pygame.display.flip()
+            pygame.event.pump()
+            task.thread.join(1 / 30)
+        return task.result()
+
+    def record_score(self):
+        """Puts the current run on the leaderboard, once per run and never for replays."""
+        if self.replaying or self.score_recorded:
+            return
+        self.score_recorded = True
+        sim = self.sim
+        rank = LEADERBOARD.record(sim.player.score, sim.wave, sim.player.level, sim.total_kills, sim.game_time / FPS)
+        if rank == 1:
+            print(f"New high score saved: {sim.player.score}")
+
+    def music_state(self):
+        if self.sim.victory:
+            return "victory"
+        if self.sim.game_over:
+            return "game_over"
+        return "gameplay" if self.sim.boss is None else "boss"
 
     def draw_victory(self):
-        victory_text = self.font.render("VICTORY!", True, YELLOW)
-        score_text = self.font.render(f"Final Score: {self.player.score}", True, WHITE)
-        wave_text = self.font.render(f"Waves Survived: {self.wave}", True, WHITE)
-        level_text = self.font.render(f"Final Level: {self.player.level}", True, WHITE)
+        victory_text = TEXTS.render(self.font, "VICTORY!", YELLOW)
+        score_text = TEXTS.render(self.font, f"Final Score: {self.sim.player.score}", WHITE)
+        wave_text = TEXTS.render(self.font, f"Waves Survived: {self.sim.wave}", WHITE)
+        level_text = TEXTS.render(self.font, f"Final Level: {self.sim.player.level}", WHITE)
 
-        high_score_text = self.font.render(f"Highest Score: {self.high_score}", True, WHITE)
+        high_score_text = TEXTS.render(self.font, f"Highest Score: {self.high_score}", WHITE)
         new_high_score_text = None
-        if self.player.score > self.high_score:
-            new_high_score_text = self.font.render(f"New Highest Score: {self.player.score}!!!!", True, GREEN)
+        if self.sim.player.score > self.high_score:
+            new_high_score_text = TEXTS.render(self.font, f"New Highest Score: {self.sim.player.score}!!!!", GREEN)
 
         text_y = SCREEN_HEIGHT // 2 - 100
         for text in [victory_text, score_text, wave_text, level_text, high_score_text]:
@@ -957,22 +2790,20 @@ class Game:
             text_rect = new_high_score_text.get_rect(center=(SCREEN_WIDTH // 2, text_y))
             self.screen.blit(new_high_score_text, text_rect)
 
-        restart_text = self.font.render("Press R to Play Again or ESC to Quit", True, WHITE)
+        restart_text = TEXTS.render(self.font, "Press R to Play Again or ESC to Quit", WHITE)
         restart_rect = restart_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT - 100))
         self.screen.blit(restart_text, restart_rect)
 
     def draw_game_over(self):
-        game_over_text = self.font.render("GAME OVER", True, RED)
-        score_text = self.font.render(f"Final Score: {self.player.score}", True, WHITE)
-        wave_text = self.font.render(f"Waves Survived: {self.wave}", True, WHITE)
-        level_text = self.font.render(f"Final Level: {self.player.level}", True, WHITE)
+        game_over_text = TEXTS.render(self.font, "GAME OVER", RED)
+        score_text = TEXTS.render(self.font, f"Final Score: {self.sim.player.score}", WHITE)
+        wave_text = TEXTS.render(self.font, f"Waves Survived: {self.sim.wave}", WHITE)
+        level_text = TEXTS.render(self.font, f"Final Level: {self.sim.player.level}", WHITE)
 
-        high_score_text = self.font.render(f"Highest Score: {self.high_score}", True, WHITE)
+        high_score_text = TEXTS.render(self.font, f"Highest Score: {self.high_score}", WHITE)
         new_high_score_text = None
-        if self.player.score > self.high_score:
-            new_high_score_text = self.font.render(f"New Highest Score: {self.player.score}!!!!", True, GREEN)
-            self.high_score = self.player.score
-            self.save_high_score()
+        if self.sim.player.score > self.high_score:
+            new_high_score_text = TEXTS.render(self.font, f"New Highest Score: {self.sim.player.score}!!!!", GREEN)
 
         text_y = SCREEN_HEIGHT // 2 - 100
         for text in [game_over_text, score_text, wave_text, level_text, high_score_text]:
@@ -984,34 +2815,181 @@ class Game:
             text_rect = new_high_score_text.get_rect(center=(SCREEN_WIDTH // 2, text_y))
             self.screen.blit(new_high_score_text, text_rect)
 
-        restart_text = self.font.render("Press R to Restart or ESC to Quit", True, WHITE)
+        restart_text = TEXTS.render(self.font, "Press R to Restart or ESC to Quit", WHITE)
         restart_rect = restart_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT - 100))
         self.screen.blit(restart_text, restart_rect)
 
     def draw_hud(self):
         # Draw score
-        score_text = self.font.render(f"Score: {self.player.score}", True, WHITE)
-        self.screen.blit(score_text, (10, 10))
+        score_text = TEXTS.render(self.font, f"Score: {self.sim.player.score}", WHITE)
+        rects = [self.screen.blit(score_text, (10, 10))]
 
-        self.score_predictor.draw(self.screen)
+        rects += self.sim.score_predictor.draw(self.screen)
 
         # Draw wave information
-        wave_text = self.font.render(f"Wave {self.wave}", True, WHITE)
+        wave_text = TEXTS.render(self.font, f"Wave {self.sim.wave}", WHITE)
         wave_rect = wave_text.get_rect(topright=(SCREEN_WIDTH - 10, 10))
-        self.screen.blit(wave_text, wave_rect)
+        rects.append(self.screen.blit(wave_text, wave_rect))
 
         # Draw health
-        health_text = self.font.render(f"Health: {int(self.player.health)}", True, WHITE)
-        self.screen.blit(health_text, (10, 40))
+        health_text = TEXTS.render(self.font, f"Health: {int(self.sim.player.health)}", WHITE)
+        rects.append(self.screen.blit(health_text, (10, 40)))
 
         # Draw level
-        level_text = self.font.render(f"Level: {self.player.level}", True, WHITE)
+        level_text = TEXTS.render(self.font, f"Level: {self.sim.player.level}", WHITE)
         level_rect = level_text.get_rect(topright=(SCREEN_WIDTH - 10, 40))
-        self.screen.blit(level_text, level_rect)
+        rects.append(self.screen.blit(level_text, level_rect))
+        return rects
+
+    def read_input(self):
+        keys = pygame.key.get_pressed()
+        mouse_x, mouse_y = pygame.mouse.get_pos()
+        inputs = FrameInput(keys[pygame.K_w], keys[pygame.K_s], keys[pygame.K_a], keys[pygame.K_d],
+                            mouse_x, mouse_y, self.upgrade_choice)
+        self.upgrade_choice = -1
+        return inputs
+
+    def update(self, inputs, timer=NULL_TIMER):
+        """Steps the simulation and reacts to what happened (menus, music, end of run)."""
+        self.sim.step(inputs, timer)
+
+        if self.sim.upgrade_options and not self.upgrade_menu.visible:
+            self.upgrade_menu.show(self.sim.upgrade_options)
+        elif not self.sim.upgrade_options and self.upgrade_menu.visible:
+            self.upgrade_menu.hide()  # Picked without the menu, e.g. in a replay
+
+        AUDIO.update(self.music_state())
+
+        if (self.sim.game_over or self.sim.victory) and not self.run_recorded:
+            self.training_store.append_session(self.sim.score_predictor.session_samples)
+            self.record_score()
+            self.run_recorded = True
+
+    def draw_playfield(self, alpha):
+        """Draws the entities, interpolated by `alpha`, and the HUD; returns the rects they cover."""
+        self.sim.player.draw(self.batch, alpha)
+        for enemy in self.sim.enemies:
+            enemy.draw(self.batch, alpha)
+        rects = self.batch.flush(self.screen, doreturn=self.dirty_rects)
+        rects += self.draw_hud()
+        if self.show_profiler:
+            rects += self.profiler.draw(self.screen)
+        return rects
+
+    def draw(self, alpha=1.0):
+        """Renders the frame `alpha` of a step past the last state; records what present() updates."""
+        playing = not (self.sim.victory or self.sim.game_over or self.upgrade_menu.visible)
+        if self.dirty_rects and playing and self.previous_rects is not None:
+            self.screen.blits([(self.background, rect, rect) for rect in self.previous_rects], doreturn=False)
+            rects = self.draw_playfield(alpha)
+            self.update_rects = self.previous_rects + rects
+            self.previous_rects = rects
+            return
+
+        self.screen.fill(BLACK)
+        rects = None
+
+        if self.sim.victory:
+            self.draw_victory()
+
+        elif not self.sim.game_over:
+            self.screen.blit(self.background, (0, 0))
+            rects = self.draw_playfield(alpha)
+            self.upgrade_menu.draw()
+
+        else:
+            self.draw_game_over()
+
+        if self.show_profiler and rects is None:  # Gameplay frames draw the overlay with the playfield
+            self.profiler.draw(self.screen)
+
+        # Full redraws are flipped; the next dirty frame can build on this one only if it was plain gameplay
+        self.update_rects = None
+        self.previous_rects = rects if self.dirty_rects and playing else None
+
+    def present(self):
+        """Puts the frame on the display, falling back to a full flip when the dirty area is too large."""
+        rects = self.update_rects
+        if rects is None or sum(rect.w * rect.h for rect in rects) > DIRTY_AREA_LIMIT * SCREEN_WIDTH * SCREEN_HEIGHT:
+            pygame.display.flip()
+        else:
+            pygame.display.update(rects)
 
-    def run(self):
+    def save_snapshot(self, path=SNAPSHOT_FILE):
+        start = time.perf_counter()
+        self.sim.save(path)
+        print(f"Snapshot saved to {path} in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    def load_snapshot(self, path=SNAPSHOT_FILE):
+        """Swaps in a saved game. Returns False if there was nothing loadable at `path`."""
+        start = time.perf_counter()
+        try:
+            sim = Simulation.load(path)
+        except (OSError, ValueError) as e:
+            print(f"Error loading snapshot: {e}")
+            return False
+        self.sim = sim
+        self.previous_rects = None
+        self.run_recorded = self.score_recorded = sim.game_over or sim.victory
+        AUDIO.update(self.music_state())
+        print(f"Snapshot loaded from {path} in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return True
+
+    def replay(self, path, profile_path=None):
+        """Plays a recording back on screen, one step per drawn frame, without saving any results."""
+        seed, width, height, inputs = InputRecording.load(path)
+        self.sim = Simulation(width, height, seed=seed, high_score=self.high_score,
+                              prior=self.training_store.prior())
+        self.replaying = True
+        self.run_recorded = True  # Keeps update() from recording the replayed run
+        if profile_path:
+            self.profiler = FrameProfiler()
+            self.show_profiler = True
+        start = time.perf_counter()
+        steps = 0
+        for frame_input in inputs:
+            timer = self.profiler if self.show_profiler else NULL_TIMER
+            timer.start()
+            if any(event.type == pygame.QUIT or event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE
+                   for event in pygame.event.get()):
+                break
+            timer.lap("input")
+            self.update(frame_input, timer)
+            self.draw()
+            timer.lap("draw")
+            self.present()
+            timer.lap("flip")
+            if timer is not NULL_TIMER:
+                self.profiler.end_frame(self.sim)
+            steps += 1
+
+        elapsed = time.perf_counter() - start
+        print(f"Replayed {steps} of {len(inputs)} steps in {elapsed:.2f} s ({steps / elapsed:,.1f} frames/s)")
+        if self.profiler is not None and self.profiler.frames:
+            self.profiler.dump_csv(profile_path or PROFILE_FILE)
+            print(f"Frame profile written to {profile_path or PROFILE_FILE}")
+        pygame.quit()
+
+    def run(self, profile_path=None, render_fps=RENDER_FPS, record_path=None):
+        """Main loop. `profile_path` turns the frame profiler on and saves it there as CSV on exit."""
+        if profile_path:
+            self.profiler = FrameProfiler()
+            self.show_profiler = True
+        games = 1
+        recorder = None
+        if record_path:
+            recorder = InputRecording(record_path, self.sim.seed, self.sim.width, self.sim.height)
+        step_time = 1 / FPS
+        accumulator = 0.0
+        previous_time = time.perf_counter()
         running = True
         while running:
+            timer = self.profiler if self.show_profiler else NULL_TIMER
+            timer.start()
+            now = time.perf_counter()
+            accumulator = min(accumulator + now - previous_time, MAX_CATCHUP_STEPS * step_time)
+            previous_time = now
+
             # Event handling
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
@@ -1019,103 +2997,100 @@ class Game:
                 elif event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_ESCAPE:
                         running = False
-                    elif event.key == pygame.K_r and self.game_over:
+                    elif event.key == pygame.K_F3:
+                        self.show_profiler = not self.show_profiler
+                        if self.profiler is None:
+                            self.profiler = FrameProfiler()
+                    elif event.key == pygame.K_F5:
+                        self.save_snapshot()
+                    elif event.key == pygame.K_F9:
+                        if self.load_snapshot() and recorder:
+                            recorder.close()  # A recording replays from the seed, so it cannot span a restore
+                            print(f"Input recording stopped at {recorder.path}")
+                            recorder = None
+                    elif event.key == pygame.K_r and self.sim.game_over:
                         # Reset game
-                        self.save_high_score()
-                        pygame.mixer.stop()
-                        old_high_score = self.high_score
-                        self.__init__()
-                        self.high_score = max(self.high_score, old_high_score)
-                        self.game_over = False
-
-                if self.upgrade_menu.handle_input(event, self.player):
-                    continue
-
-            if not self.game_over and not self.upgrade_menu.visible and not self.victory:
-                # Game logic
-                keys = pygame.key.get_pressed()
-                self.player.move(keys)
-                self.game_time += 1
-                previous_enemy_count = len(self.enemies)
-
-                # Auto-shoot at mouse position
-                mouse_x, mouse_y = pygame.mouse.get_pos()
-                self.player.auto_shoot(mouse_x, mouse_y)
-                self.player.update(self.enemies)
-
-                # Enemy spawning
-                self.enemy_spawn_timer += 1
-                if self.enemy_spawn_timer >= self.enemy_spawn_delay:
-                    self.spawn_enemy()
-                    self.enemy_spawn_timer = 0
-
-                # Update wave
-                self.update_wave()
-
-                # Update enemies
-                for enemy in self.enemies:
-                    enemy.move_towards_player(self.player, self.enemies)
-                    enemy.update(self.player)
-                    if enemy.enemy_type == "mage":
-                        enemy.cast_spell(self.player)
-
-                self.check_collisions()
-
-                # Count kills this frame
-                current_enemy_count = len(self.enemies)
-                new_kills = previous_enemy_count - current_enemy_count
-                if new_kills > 0:
-                    self.total_kills += new_kills
-
-                # Add data point to predictor
-                self.score_predictor.add_data_point(
-                    self.game_time,
-                    self.player.score,
-                    self.player.experience,
-                    self.total_kills,
-                    self.wave,
-                    self.player.level,
-                    self.high_score
-                )
-
-                self.check_level_up()
-
-                if self.player.health <= 0:
-                    self.game_over = True
-
-                self.check_victory()
+                        profiler, show_profiler = self.profiler, self.show_profiler
+                        self.__init__(dirty_rects=self.dirty_rects)
+                        self.profiler, self.show_profiler = profiler, show_profiler
+                        if recorder:
+                            recorder.close()
+                            games += 1
+                            stem, extension = os.path.splitext(record_path)
+                            recorder = InputRecording(f"{stem}-{games}{extension}", self.sim.seed,
+                                                      self.sim.width, self.sim.height)
+
+                choice = self.upgrade_menu.handle_input(event)
+                if choice is not None:
+                    self.upgrade_choice = choice
+
+            timer.lap("input")
+
+            while accumulator >= step_time:
+                inputs = self.read_input()
+                if recorder:
+                    recorder.record(inputs)
+                self.update(inputs, timer)
+                accumulator -= step_time
 
             # Drawing
-            self.screen.fill(BLACK)
-
-            if self.victory:
-                self.draw_victory()
-                pygame.mixer.music.stop()
-                self.victory_music.play()
-
-            elif not self.game_over:
-                self.screen.blit(self.background, (0, 0))
-                self.player.draw(self.screen)
-                for enemy in self.enemies:
-                    enemy.draw(self.screen)
-                self.draw_hud()
-                self.upgrade_menu.draw()
-
-                # ✅ Draw score prediction here
-                self.score_predictor.draw(self.screen)
-
-            else:
-                self.draw_game_over()
-                pygame.mixer.music.stop()
-                self.game_over_music.play(-1)
-
-            pygame.display.flip()
-            self.clock.tick(FPS)
-
-        self.save_high_score()
+            self.draw(accumulator / step_time)
+            timer.lap("draw")
+            self.present()
+            timer.lap("flip")
+            if timer is not NULL_TIMER:
+                self.profiler.end_frame(self.sim)
+            self.clock.tick(render_fps)
+
+        if recorder:
+            recorder.close()
+            print(f"Input recorded to {recorder.path}")
+        if self.profiler is not None and self.profiler.frames:
+            self.profiler.dump_csv(profile_path or PROFILE_FILE)
+            print(f"Frame profile written to {profile_path or PROFILE_FILE}")
+            print(f"Asset cache: {ASSETS.stats()}, rotation cache: {ROTATIONS.stats()}, text cache: {TEXTS.stats()}")
+        self.record_score()  # A run quit part way still counts
+        LEADERBOARD.flush()
         pygame.quit()
 
 
 if __name__ == "__main__":
-    game = Game()
-    game.run()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bullet Hell Game")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="print how long each startup phase took")
+    parser.add_argument("--profile", nargs="?", const=PROFILE_FILE, metavar="CSV",
+                        help="start with the frame profiler on (F3 toggles it) and save it as CSV on exit")
+    parser.add_argument("--render-fps", type=int, default=RENDER_FPS,
+                        help=f"cap on frames drawn per second, 0 for none (the game always runs at {FPS} steps/s)")
+    parser.add_argument("--dirty-rects", action="store_true",
+                        help="redraw and update only the screen areas that changed during gameplay")
+    parser.add_argument("--record", metavar="FILE", help="record every step's input to FILE for replaying")
+    parser.add_argument("--replay", metavar="FILE", help="play back a recording as fast as possible")
+    parser.add_argument("--headless", action="store_true", help="with --replay, run without a display")
+    parser.add_argument("--leaderboard", action="store_true", help="print the high score table and exit")
+    parser.add_argument("--snapshot", metavar="FILE",
+                        help=f"start from a saved game (F5 saves one to {SNAPSHOT_FILE}, F9 loads it)")
+    args = parser.parse_args()
+    if args.snapshot and (args.record or args.replay):
+        parser.error("recordings start from a seed, so --snapshot cannot be combined with --record or --replay")
+
+    if args.leaderboard:
+        print(LEADERBOARD.format())
+        raise SystemExit
+
+    if args.replay and args.headless:
+        replay_headless(args.replay)
+        raise SystemExit
+
+    STARTUP.mark("imports")
+    game = Game(startup=STARTUP, dirty_rects=args.dirty_rects)
+    if args.startup_report:
+        print(STARTUP.report())
+    if args.snapshot and not game.load_snapshot(args.snapshot):
+        raise SystemExit(1)
+    if args.replay:
+        game.replay(args.replay, profile_path=args.profile)
+    else:
+        game.run(profile_path=args.profile, render_fps=args.render_fps, record_path=args.record)
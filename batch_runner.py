@@ -0,0 +1,174 @@
+"""Headless batch runs of Bullet Hell Game.
+
+Plays many seeded games with a scripted input policy across a process pool, without a window and as fast as
+the simulation allows, and writes one row of stats per run to a columnar .npz file.
+
+    python batch_runner.py --runs 1000                      # kite policy on every core -> batch_results.npz
+    python batch_runner.py --runs 200 --policy circle --workers 4 --first-seed 5000
+    python -c "import numpy as np; r = np.load('batch_results.npz'); print(r['wave'].mean())"
+"""
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import multiprocessing
+import random
+import time
+
+import numpy as np
+
+import Game
+import benchmark
+
+# One row per run; column name -> dtype
+COLUMNS = {
+    "seed": np.int64,
+    "frames": np.int32,
+    "wave": np.int16,
+    "level": np.int16,
+    "kills": np.int32,
+    "score": np.int64,
+    "victory": np.bool_,
+    "died": np.bool_,
+    "boss_spawn_frame": np.int32,  # -1 if the boss never appeared
+    "boss_kill_frame": np.int32,  # -1 if the boss was not killed
+    "sim_seconds": np.float64,
+    "steps_per_second": np.float64,
+}
+
+
+def nearest_enemy(sim):
+    player = sim.player
+    return min(sim.enemies, key=lambda enemy: (enemy.x - player.x) ** 2 + (enemy.y - player.y) ** 2, default=None)
+
+
+def idle_policy(frame, sim, rng):
+    """Stands still and aims at the nearest enemy."""
+    target = nearest_enemy(sim)
+    if target is None:
+        return Game.FrameInput(upgrade_choice=0)
+    return Game.FrameInput(mouse_x=int(target.x), mouse_y=int(target.y), upgrade_choice=0)
+
+
+def circle_policy(frame, sim, rng):
+    """The benchmark scenarios' scripted input: circles the arena centre while sweeping the aim."""
+    return benchmark.scripted_input(frame, sim)
+
+
+def kite_policy(frame, sim, rng):
+    """Backs away from the nearest enemy while shooting at it, drifting to the centre when cornered; picks
+    random upgrades."""
+    player = sim.player
+    target = nearest_enemy(sim)
+    choice = rng.randrange(len(sim.upgrade_options)) if sim.upgrade_options else -1
+    if target is None:
+        return Game.FrameInput(upgrade_choice=choice)
+
+    away_x, away_y = player.x - target.x, player.y - target.y
+    margin = 100
+    if not margin < player.x < sim.width - margin or not margin < player.y < sim.height - margin:
+        away_x, away_y = sim.width / 2 - player.x, sim.height / 2 - player.y
+    return Game.FrameInput(up=away_y < -1, down=away_y > 1, left=away_x < -1, right=away_x > 1,
+                           mouse_x=int(target.x), mouse_y=int(target.y), upgrade_choice=choice)
+
+
+def random_policy(frame, sim, rng):
+    """Holds a random direction for half a second at a time and aims at a random point."""
+    held = random.Random(sim.seed * 100003 + frame // 30)
+    up, down, left, right = (held.random() < 0.5 for _ in range(4))
+    mouse_x, mouse_y = held.randrange(sim.width), held.randrange(sim.height)
+    choice = rng.randrange(len(sim.upgrade_options)) if sim.upgrade_options else -1
+    return Game.FrameInput(up, down, left, right, mouse_x, mouse_y, choice)
+
+
+POLICIES = {
+    "idle": idle_policy,
+    "circle": circle_policy,
+    "kite": kite_policy,
+    "random": random_policy,
+}
+
+
+def run_game(job):
+    """Plays one game to the end (or `max_frames` steps) and returns its row of stats."""
+    seed, policy_name, max_frames, width, height = job
+    policy = POLICIES[policy_name]
+    rng = random.Random(seed)  # The policy's own randomness, separate from the simulation's
+    sim = Game.Simulation(width, height, seed=seed)
+    boss_spawn_frame = boss_kill_frame = -1
+
+    start = time.perf_counter()
+    frame = 0
+    while frame < max_frames and not (sim.game_over or sim.victory):
+        sim.step(policy(frame, sim, rng))
+        frame += 1
+        if sim.boss is not None:
+            if boss_spawn_frame < 0:
+                boss_spawn_frame = frame
+            if boss_kill_frame < 0 and sim.boss.health <= 0:
+                boss_kill_frame = frame
+    elapsed = time.perf_counter() - start
+
+    return {
+        "seed": seed,
+        "frames": frame,
+        "wave": sim.wave,
+        "level": sim.player.level,
+        "kills": sim.total_kills,
+        "score": sim.player.score,
+        "victory": sim.victory,
+        "died": sim.game_over,
+        "boss_spawn_frame": boss_spawn_frame,
+        "boss_kill_frame": boss_kill_frame,
+        "sim_seconds": elapsed,
+        "steps_per_second": frame / elapsed if elapsed else 0.0,
+    }
+
+
+def summarize(columns, wall_time):
+    runs = len(columns["seed"])
+    print(f"{runs} runs in {wall_time:.1f} s ({columns['frames'].sum() / wall_time:,.0f} steps/s overall, "
+          f"{np.median(columns['steps_per_second']):,.0f} per worker)")
+    print(f"wave     mean {columns['wave'].mean():.2f}  max {columns['wave'].max()}")
+    print(f"score    p10 {np.percentile(columns['score'], 10):,.0f}  p50 {np.percentile(columns['score'], 50):,.0f}"
+          f"  p90 {np.percentile(columns['score'], 90):,.0f}")
+    print(f"kills    mean {columns['kills'].mean():.1f}")
+    print(f"died {columns['died'].mean():.1%}  won {columns['victory'].mean():.1%}")
+    killed = columns["boss_kill_frame"] >= 0
+    if killed.any():
+        fight = columns["boss_kill_frame"][killed] - columns["boss_spawn_frame"][killed]
+        print(f"boss kill time  mean {fight.mean() / Game.FPS:.1f} s over {killed.sum()} kills")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many headless Bullet Hell games and collect their stats.")
+    parser.add_argument("--runs", type=int, default=100, help="number of games to play")
+    parser.add_argument("--first-seed", type=int, default=0, help="seed of the first game; the rest count up")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="kite", help="scripted input policy")
+    parser.add_argument("--max-frames", type=int, default=20 * 1800,
+                        help="stop a game that has not ended after this many steps")
+    parser.add_argument("--size", default="1920x1080", help="arena size as WIDTHxHEIGHT")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="processes to run games on")
+    parser.add_argument("--output", default="batch_results.npz", help="columnar .npz file to write")
+    args = parser.parse_args()
+    width, height = (int(value) for value in args.size.lower().split("x"))
+
+    jobs = [(seed, args.policy, args.max_frames, width, height)
+            for seed in range(args.first_seed, args.first_seed + args.runs)]
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.workers) as pool:
+        # Games vary a lot in length, so hand them out one at a time and keep every worker busy
+        rows = list(pool.imap_unordered(run_game, jobs, chunksize=1))
+    wall_time = time.perf_counter() - start
+
+    rows.sort(key=lambda row: row["seed"])
+    columns = {name: np.array([row[name] for row in rows], dtype=dtype) for name, dtype in COLUMNS.items()}
+    np.savez(args.output, policy=args.policy, width=width, height=height, **columns)
+    summarize(columns, wall_time)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
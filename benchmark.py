@@ -0,0 +1,250 @@
+"""Frame-loop benchmarks for Bullet Hell Game.
+
+Runs canned scenarios from a seeded start for a fixed number of frames, timing each stage of the frame
+(player update, enemy AI, collisions, predictor, drawing, flip) separately, and writes the results to JSON.
+
+    python benchmark.py                                  # all scenarios -> benchmark_results.json
+    python benchmark.py enemies_200 boss_phase3 --frames 300
+    python benchmark.py --baseline old_results.json      # also report changes against an earlier run
+    python benchmark.py --dirty-rects                    # render in dirty-rect mode
+    python benchmark.py boss_phase3 --save-snapshot boss.bhs   # keep the state the scenario ended in
+    python benchmark.py --snapshot boss.bhs              # benchmark from a saved game (Game.py F5 or the above)
+
+After the scenarios it reports the memory held by each live bullet and enemy object, how many of them the
+free lists recycled, and the asset, rotation and text cache counters.
+"""
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import json
+import math
+import platform
+import random
+import time
+import tracemalloc
+
+import numpy as np
+import pygame
+
+import Game
+
+SEED = 1234
+STAGES = ("player", "enemies", "collisions", "predictor", "draw", "flip")
+
+
+def scripted_input(frame, sim):
+    """Circles around the arena centre while sweeping the aim; always takes the first upgrade offered."""
+    angle = frame / 90
+    aim = frame / 25
+    return Game.FrameInput(up=math.sin(angle) < -0.3, down=math.sin(angle) > 0.3,
+                           left=math.cos(angle) < -0.3, right=math.cos(angle) > 0.3,
+                           mouse_x=int(sim.width / 2 + math.cos(aim) * sim.width / 3),
+                           mouse_y=int(sim.height / 2 + math.sin(aim) * sim.height / 3),
+                           upgrade_choice=0)
+
+
+def make_invulnerable(sim):
+    sim.player.max_health = sim.player.health = 10 ** 9
+
+
+def spawn_ring(sim, count, inner=300, outer=700):
+    """Places `count` enemies of mixed types on a ring around the player."""
+    rng = random.Random(SEED)
+    for _ in range(count):
+        angle = rng.uniform(0, 2 * math.pi)
+        distance = rng.uniform(inner, outer)
+        enemy_type = rng.choice(["tank", "assassin", "mage"])
+        sim.add_enemy(Game.ENEMIES.acquire(sim.player.x + math.cos(angle) * distance,
+                                           sim.player.y + math.sin(angle) * distance, enemy_type, sim.wave))
+
+
+def enemies_scenario(count):
+    def setup(sim):
+        make_invulnerable(sim)
+        spawn_ring(sim, count)
+    return setup
+
+
+def burst_homing(sim):
+    make_invulnerable(sim)
+    for _ in range(3):
+        Game.upgrade_burst_fire(sim.player)
+        Game.increase_fire_rate(sim.player)
+    Game.upgrade_homing(sim.player)
+    spawn_ring(sim, 200)
+
+
+def boss_phase3(sim):
+    make_invulnerable(sim)
+    sim.wave = 5
+    sim.boss = Game.Boss(sim.width // 2, sim.height // 4, sim.width, sim.height, sim.rng)
+    sim.boss.health = sim.boss.max_health * 0.25
+    sim.add_enemy(sim.boss)
+
+
+def full_run(sim):
+    make_invulnerable(sim)
+
+
+# name -> (setup, frames)
+SCENARIOS = {
+    "enemies_50": (enemies_scenario(50), 600),
+    "enemies_200": (enemies_scenario(200), 600),
+    "enemies_1000": (enemies_scenario(1000), 300),
+    "burst_homing": (burst_homing, 600),
+    "boss_phase3": (boss_phase3, 1200),
+    "waves_1_10": (full_run, 10 * 1800),
+}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_scenario(game, name, frames=None, snapshot=None):
+    """Runs a named scenario, or with `snapshot` a saved game for `frames` (default 600) frames."""
+    if snapshot:
+        sim, frames = Game.Simulation.load(snapshot), frames or 600
+    else:
+        setup, default_frames = SCENARIOS[name]
+        frames = frames or default_frames
+        sim = Game.Simulation(Game.SCREEN_WIDTH, Game.SCREEN_HEIGHT, seed=SEED)
+        setup(sim)
+    game.sim = sim
+    game.previous_rects = None  # Start from a full redraw
+
+    timer = Game.StageTimer()
+    frame_times = []
+    peak_enemies = peak_bullets = 0
+    for frame in range(frames):
+        timer.start()
+        begin = timer.last
+        sim.step(scripted_input(frame, sim), timer)
+        game.draw()
+        timer.lap("draw")
+        game.present()
+        timer.lap("flip")
+        frame_times.append(timer.last - begin)
+        peak_enemies = max(peak_enemies, len(sim.enemies))
+        peak_bullets = max(peak_bullets, len(sim.player.bullets) + sum(len(enemy.bullets) for enemy in sim.enemies))
+
+    total = sum(frame_times)
+    return {
+        "frames": frames,
+        "fps": frames / total,
+        "frame_mean_ms": total / frames * 1000,
+        "frame_p50_ms": percentile(frame_times, 0.50) * 1000,
+        "frame_p99_ms": percentile(frame_times, 0.99) * 1000,
+        "stages_mean_ms": {stage: timer.totals.get(stage, 0.0) / frames * 1000 for stage in STAGES},
+        "peak_enemies": peak_enemies,
+        "peak_bullets": peak_bullets,
+        "final_wave": sim.wave,
+        "final_score": sim.player.score,
+    }, sim
+
+
+def entity_bytes(make, count=2000):
+    """Average bytes allocated per object built by `make(i)`, counting everything it owns (its attribute
+    storage, an enemy's empty bullet list) but not the list the benchmark holds them in."""
+    tracemalloc.start()
+    items = [None] * count
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(count):
+        items[i] = make(i)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / count
+
+
+def memory_report():
+    """Bytes per live bullet and enemy object, and how often the free lists recycled instead of allocating."""
+    types = ["tank", "assassin", "mage"]
+    return {
+        "bytes_per_bullet": entity_bytes(lambda i: Game.Bullet(i, i, 0, 0, speed=4, color=Game.YELLOW, homing=True)),
+        "bytes_per_enemy": entity_bytes(lambda i: Game.Enemy(i, i, types[i % 3])),
+        "free_lists": {"bullets": Game.BULLETS.stats(), "enemies": Game.ENEMIES.stats()},
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Prints the change in mean frame time per scenario; returns the scenarios that regressed."""
+    regressions = []
+    for name, result in results["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if not old:
+            continue
+        change = result["frame_mean_ms"] / old["frame_mean_ms"] - 1
+        print(f"{name:<14} {old['frame_mean_ms']:8.3f} ms -> {result['frame_mean_ms']:8.3f} ms ({change:+.1%})")
+        if change > tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Bullet Hell frame loop.")
+    parser.add_argument("scenarios", nargs="*", help=f"scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument("--frames", type=int, help="override the number of frames per scenario")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file to write")
+    parser.add_argument("--baseline", help="earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="fractional slowdown in mean frame time that counts as a regression")
+    parser.add_argument("--dirty-rects", action="store_true", help="render in dirty-rect mode")
+    parser.add_argument("--snapshot", action="append", default=[], metavar="FILE",
+                        help="also benchmark a saved game (repeatable)")
+    parser.add_argument("--save-snapshot", metavar="FILE", help="save the state the last scenario ended in")
+    args = parser.parse_args()
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario {name!r}")
+
+    game = Game.Game(seed=SEED, dirty_rects=args.dirty_rects)
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "resolution": [Game.SCREEN_WIDTH, Game.SCREEN_HEIGHT],
+            "seed": SEED,
+            "dirty_rects": args.dirty_rects,
+        },
+        "scenarios": {},
+    }
+    runs = [(name, None) for name in args.scenarios or ([] if args.snapshot else SCENARIOS)]
+    runs += [(f"snapshot:{os.path.basename(path)}", path) for path in args.snapshot]
+    sim = None
+    for name, snapshot in runs:
+        result, sim = run_scenario(game, name, args.frames, snapshot)
+        results["scenarios"][name] = result
+        stages = "  ".join(f"{stage} {result['stages_mean_ms'][stage]:.3f}" for stage in STAGES)
+        print(f"{name:<14} {result['frame_mean_ms']:8.3f} ms/frame (p99 {result['frame_p99_ms']:.3f})  {stages}")
+
+    results["memory"] = memory = memory_report()
+    print(f"memory         {memory['bytes_per_bullet']:.0f} B/bullet  {memory['bytes_per_enemy']:.0f} B/enemy  "
+          f"free lists {memory['free_lists']}")
+    results["caches"] = caches = {"assets": Game.ASSETS.stats(), "rotations": Game.ROTATIONS.stats(),
+                                  "texts": Game.TEXTS.stats()}
+    print(f"caches         {caches}")
+
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {args.output}")
+    if args.save_snapshot and sim is not None:
+        sim.save(args.save_snapshot)
+        print(f"Final state saved to {args.save_snapshot}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        if regressions:
+            print(f"Regressed: {', '.join(regressions)}")
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()